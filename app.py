@@ -1,26 +1,73 @@
 #==========================
 #         Imports
 #==========================
-from flask import Flask, request, jsonify, render_template, session, redirect
+import time
+_import_started = time.perf_counter()  # start of the startup timing report, see startup_phase()
+from flask import Flask, request, jsonify, render_template, session, redirect, Response, stream_with_context, g, url_for, send_from_directory
 import sqlite3
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
 import os
 import json
 import hashlib
 import hmac
 import threading
-import time
 import re
+import math
+import collections
+import itertools
+import weakref
 import random
-import ollama 
+import csv
+import io
 from concurrent.futures import ThreadPoolExecutor
 import argparse
+import cProfile
+import sys
+import logging
+import logging.handlers
+import queue
+import atexit
+import uuid
+import shutil
+import gzip
+import mimetypes
+import asyncio
+import functools
+from urllib.parse import parse_qs
+from werkzeug.http import parse_cookie
+from itsdangerous import BadData
+try:
+    import orjson  # optional faster JSON encoder for the streamed list endpoints
+except ImportError:
+    orjson = None
+try:
+    import brotli  # optional: adds .br variants to the static asset build
+except ImportError:
+    brotli = None
 
 #==========================
 #          Init
 #==========================
 app = Flask(__name__)
 
+# Startup timing: each startup_phase() call records the time since the previous one; report_startup() logs them.
+_startup_phases = []
+_startup_mark = _import_started
+
+def startup_phase(name):
+    global _startup_mark
+    now = time.perf_counter()
+    _startup_phases.append((name, now - _startup_mark))
+    _startup_mark = now
+
+def report_startup():
+    """Log the startup phases; APP_LAUNCH_TIME (set by run_app.py) adds the launcher's share."""
+    total = sum(seconds for _, seconds in _startup_phases)
+    phases = ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in _startup_phases)
+    launched = os.environ.get("APP_LAUNCH_TIME")
+    since_launch = f", {time.time() - float(launched):.2f}s since run_app.py started" if launched else ""
+    deb_mes("Startup: %s; ready in %.2fs%s", phases, total, since_launch, level=logging.INFO)
+
 # Secret key fallback is defined here for local development.
 # For secure deployments, set the SECRET_KEY environment variable.
 app.secret_key = os.environ.get('SECRET_KEY', 'furryfemboy')
@@ -29,88 +76,765 @@ DATABASE = 'database.db'
 VERBOSE_LOGGING = True
 HMAC_FILE = DATABASE + ".hmac"
 
+# Sharded storage: with STORAGE_SHARDS > 1 each user's words and suggestion buffers live in
+# database.shard<N>.db (N = user id % STORAGE_SHARDS), each with its own lock and HMAC seal.
+# The users table always stays in DATABASE. Change the count with: python app.py --migrate-shards N
+STORAGE_SHARDS = int(os.environ.get("STORAGE_SHARDS", "1"))
+
+# Online backups: snapshot every BACKUP_INTERVAL seconds (0 = off) into BACKUP_DIR, keeping BACKUP_KEEP.
+# The copy advances BACKUP_PAGES pages per step and sleeps BACKUP_STEP_SLEEP between steps.
+BACKUP_DIR = os.environ.get("BACKUP_DIR", "backups")
+BACKUP_INTERVAL = int(os.environ.get("BACKUP_INTERVAL", "0"))
+BACKUP_KEEP = int(os.environ.get("BACKUP_KEEP", "7"))
+BACKUP_PAGES = int(os.environ.get("BACKUP_PAGES", "256"))
+BACKUP_STEP_SLEEP = float(os.environ.get("BACKUP_STEP_SLEEP", "0.01"))
+BACKUP_MAX_RESTARTS = 3  # after this many writer-induced restarts the rest is copied in one step
+BACKUP_PARTIAL_MAX_AGE = 6 * 3600  # seconds before an unfinished snapshot is considered abandoned
+
+# Maintenance: every MAINTENANCE_INTERVAL seconds (0 = off) free pages are released MAINTENANCE_VACUUM_PAGES
+# at a time, planner statistics refreshed and suggestion buffers untouched for BUFFER_STALE_DAYS dropped
+# (or cut to BUFFER_MAX_ITEMS). MAINTENANCE_STEP_SLEEP is the pause between the committed steps.
+MAINTENANCE_INTERVAL = int(os.environ.get("MAINTENANCE_INTERVAL", "86400"))
+MAINTENANCE_VACUUM_PAGES = int(os.environ.get("MAINTENANCE_VACUUM_PAGES", "1024"))
+MAINTENANCE_STEP_SLEEP = float(os.environ.get("MAINTENANCE_STEP_SLEEP", "0.2"))
+BUFFER_STALE_DAYS = int(os.environ.get("BUFFER_STALE_DAYS", "30"))
+BUFFER_MAX_ITEMS = int(os.environ.get("BUFFER_MAX_ITEMS", "40"))
+
+# Practice event log: attempts are buffered in memory and written in batches; a background
+# aggregator folds them into daily/weekly rollups and compacts raw events older than the retention.
+EVENT_BATCH_SIZE = int(os.environ.get("EVENT_BATCH_SIZE", "200"))
+EVENT_FLUSH_INTERVAL = float(os.environ.get("EVENT_FLUSH_INTERVAL", "2"))
+ROLLUP_INTERVAL = float(os.environ.get("ROLLUP_INTERVAL", "30"))
+EVENT_RETENTION_DAYS = int(os.environ.get("EVENT_RETENTION_DAYS", "90"))
+
+# Offline practice sync: max results per /sync_scores request, and how long applied client ids are remembered.
+SYNC_MAX_EVENTS = int(os.environ.get("SYNC_MAX_EVENTS", "500"))
+SYNC_ID_RETENTION_DAYS = int(os.environ.get("SYNC_ID_RETENTION_DAYS", "30"))
+
 # Ollama settings
 OLLAMA_MODEL = os.environ.get("OLLAMA_MODEL", "gemma3:4b")
 OLLAMA_TIMEOUT = int(os.environ.get('OLLAMA_TIMEOUT', '180'))  # seconds for timeouts/polling
 
+# New (not yet known) words each suggestion fill aims to deliver, and the most pairs asked for in one call.
+SUGGESTION_TARGET = int(os.environ.get("SUGGESTION_TARGET", "4"))
+SUGGESTION_MAX_REQUEST = int(os.environ.get("SUGGESTION_MAX_REQUEST", "16"))
+EXCLUSION_HINT_WORDS = 30  # words listed in the prompt as "do not use"
+
+def _quota_setting(name, default):
+    """Parse a "<calls per minute>/<burst>" quota from the environment."""
+    rate, burst = os.environ.get(name, default).split('/')
+    return float(rate), int(burst)
+
+# Token-bucket limits on model calls, per user and across all users, with separate budgets per kind.
+GENERATION_QUOTAS = {
+    'random': {'user': _quota_setting("GEN_QUOTA_USER_RANDOM", "6/4"), 'global': _quota_setting("GEN_QUOTA_GLOBAL_RANDOM", "60/20")},
+    'smart': {'user': _quota_setting("GEN_QUOTA_USER_SMART", "6/4"), 'global': _quota_setting("GEN_QUOTA_GLOBAL_SMART", "60/20")},
+}
+SUGGESTION_POOL_SIZE = int(os.environ.get("SUGGESTION_POOL_SIZE", "500"))  # shared pairs kept for over-quota users
+
 # Maximum concurrent workers for precaching at startup
 PRECACHE_WORKERS = int(os.environ.get("PRECACHE_WORKERS", "4"))
 
-def get_db_connection():
-    """Open a sqlite3 connection using the configured DATABASE path.
-    Uses Row factory so returned rows behave like dicts in code.
+# Password hashing: KDF method passed to werkzeug (changing it rehashes passwords on next login),
+# dedicated worker count and the max number of in-flight hash jobs before answering 429
+PASSWORD_HASH_METHOD = os.environ.get("PASSWORD_HASH_METHOD", "scrypt")
+HASH_WORKERS = int(os.environ.get("HASH_WORKERS", str(min(4, os.cpu_count() or 2))))
+HASH_QUEUE_LIMIT = int(os.environ.get("HASH_QUEUE_LIMIT", str(HASH_WORKERS * 4)))
+
+# Bulk import/export: rows per executemany() batch / fetchmany() chunk
+IMPORT_BATCH_SIZE = int(os.environ.get("IMPORT_BATCH_SIZE", "500"))
+
+# Streamed list endpoints (/get_user_words, /get_word_statistics): rows per fetchmany() chunk
+STREAM_CHUNK_ROWS = int(os.environ.get("STREAM_CHUNK_ROWS", "500"))
+
+# Edit page search: default and maximum page size of /search_words
+SEARCH_PAGE_SIZE = int(os.environ.get("SEARCH_PAGE_SIZE", "50"))
+SEARCH_MAX_PAGE_SIZE = 200
+
+# Offline English-Hungarian dictionary used as a zero-latency suggestion source.
+# SUGGESTION_SOURCE: 'fallback' (serve it when the AI fails), 'first' (serve it before the AI) or 'off'
+DICTIONARY_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'dictionary_en_hu.tsv')
+DICTIONARY_DB = os.environ.get("DICTIONARY_DB", "dictionary.db")
+SUGGESTION_SOURCE = os.environ.get("SUGGESTION_SOURCE", "fallback")
+
+# Long-poll: upper bound for the ?wait= seconds a recommend request may be held while AI generation runs
+LONGPOLL_MAX_WAIT = float(os.environ.get("LONGPOLL_MAX_WAIT", "30"))
+
+# ASGI mode (--asgi): threads for the short SQLite calls of the async endpoints.
+ASYNC_DB_WORKERS = int(os.environ.get("ASYNC_DB_WORKERS", "8"))
+ASGI_WSGI_WORKERS = int(os.environ.get("ASGI_WSGI_WORKERS", "32"))  # threads running the other (Flask) routes
+ASGI_MAX_BODY = int(os.environ.get("ASGI_MAX_BODY", str(64 * 1024)))  # request body limit of the async routes
+
+# Metrics: expose Prometheus text on /metrics only when METRICS_ENABLED=1
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "0") == "1"
+
+# =========================
+#  Metrics
+# =========================
+
+# Histogram bucket upper bounds (seconds for timings, items for buffer depths).
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 180.0)
+DEPTH_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128)
+YIELD_BUCKETS = (0.0, 0.25, 0.5, 0.75, 1.0)
+
+METRIC_HELP = {
+    'http_requests_total': ('counter', 'HTTP requests by endpoint, method and status'),
+    'http_request_duration_seconds': ('histogram', 'Request latency by endpoint'),
+    'sqlite_seconds': ('histogram', 'Time spent in SQLite statements and commits'),
+    'hmac_seal_seconds': ('histogram', 'Time spent recomputing the database HMAC'),
+    'ollama_generate_seconds': ('histogram', 'Duration of ollama_generate calls by outcome'),
+    'parse_ai_pairs_failures_total': ('counter', 'AI outputs whose parsed pair count fell outside the requested min_count..count range'),
+    'suggestion_buffer_depth': ('histogram', 'Suggestion buffer depth observed before each pop'),
+    'suggestion_yield_ratio': ('histogram', 'Share of pairs per model call that were new to the user'),
+    'suggestion_model_calls_total': ('counter', 'Model calls made to fill suggestions (first call or top-up)'),
+    'suggestion_pairs_delivered_total': ('counter', 'New pairs delivered by suggestion fills'),
+    'generation_quota_taken_total': ('counter', 'Model calls admitted by the generation quotas'),
+    'generation_quota_rejected_total': ('counter', 'Model calls refused because the user or global quota was empty'),
+    'suggestion_quota_fallback_total': ('counter', 'Over-quota suggestion requests by what answered them (pool, dictionary, none)'),
+    'generation_started_total': ('counter', 'Background generation jobs started'),
+    'generation_finished_total': ('counter', 'Background generation jobs finished'),
+    'log_records_dropped_total': ('counter', 'Log records dropped because the log queue was full'),
+    'password_hash_seconds': ('histogram', 'Password KDF time on the hashing executor by operation'),
+    'password_hash_queue_seconds': ('histogram', 'Time password hash jobs waited for a hashing worker'),
+    'password_hash_rejected_total': ('counter', 'Password hash jobs rejected with 429 because the executor was full'),
+    'backup_duration_seconds': ('histogram', 'Wall time of a full online backup run'),
+    'backup_bytes_total': ('counter', 'Bytes written to backup snapshots'),
+    'maintenance_duration_seconds': ('histogram', 'Wall time of a maintenance run over all database files'),
+    'maintenance_pages_freed_total': ('counter', 'Database pages returned to the filesystem by maintenance'),
+    'maintenance_buffers_pruned_total': ('counter', 'Suggestion buffers dropped (stale) or trimmed (oversized) by maintenance'),
+    'practice_events_written_total': ('counter', 'Practice attempts written to the event log'),
+    'practice_events_compacted_total': ('counter', 'Raw practice events deleted after the retention window'),
+    'rollup_seconds': ('histogram', 'Time spent folding new practice events into the rollups'),
+    'score_sync_events_total': ('counter', 'Offline practice results received by /sync_scores by result'),
+}
+
+# Each thread updates only its own dict, so the hot path takes no lock; /metrics sums all shards.
+# The registry lock is only taken once per thread, when its shard is created, and by the scraper.
+# When a thread exits, its thread-local owner object is freed and a finalizer queues the shard (no lock);
+# queued shards are folded into _metrics_retired at the next registration or scrape, so the registry
+# only ever holds about one shard per live thread, whether or not anyone scrapes.
+_metrics_local = threading.local()
+_metrics_shards = {}  # token -> shard of a live thread
+_metrics_dead = collections.deque()  # tokens of shards whose thread has exited
+_metrics_retired = {}  # totals folded in from shards of threads that have exited
+_metrics_shards_lock = threading.Lock()
+_metrics_tokens = itertools.count()
+
+class _ShardOwner:
+    """Lives in the thread-local next to the shard; its finalizer runs when the thread's locals are freed."""
+
+def _fold_dead_shards():
+    """Fold shards of exited threads into _metrics_retired; caller holds _metrics_shards_lock."""
+    while _metrics_dead:
+        shard = _metrics_shards.pop(_metrics_dead.popleft(), None)
+        if shard is not None:
+            _metrics_merge(_metrics_retired, shard)
+
+def _metrics_shard():
+    shard = getattr(_metrics_local, 'shard', None)
+    if shard is None:
+        shard = {}
+        owner = _ShardOwner()
+        with _metrics_shards_lock:
+            _fold_dead_shards()
+            token = next(_metrics_tokens)
+            _metrics_shards[token] = shard
+        weakref.finalize(owner, _metrics_dead.append, token).atexit = False
+        _metrics_local.shard, _metrics_local.owner = shard, owner
+    return shard
+
+def _metrics_merge(into, shard):
+    """Add all counters/histograms of shard into the into dict."""
+    for key, val in list(shard.items()):
+        if isinstance(val, list):
+            acc = into.get(key)
+            if acc is None:
+                into[key] = list(val)
+            else:
+                for i in range(len(val) - 1):
+                    acc[i] += val[i]
+        else:
+            into[key] = into.get(key, 0) + val
+
+def metric_inc(name, value=1, **labels):
+    """Increment a counter. No-op unless METRICS_ENABLED."""
+    if not METRICS_ENABLED:
+        return
+    shard = _metrics_shard()
+    key = (name, tuple(sorted(labels.items())))
+    shard[key] = shard.get(key, 0) + value
+
+def metric_observe(name, value, buckets=LATENCY_BUCKETS, **labels):
+    """Record a histogram observation. No-op unless METRICS_ENABLED."""
+    if not METRICS_ENABLED:
+        return
+    shard = _metrics_shard()
+    key = (name, tuple(sorted(labels.items())))
+    h = shard.get(key)
+    if h is None:
+        # [bucket counts..., +Inf count, sum, buckets]; built whole before it is published to scrapers
+        h = [0] * (len(buckets) + 2) + [buckets]
+        shard[key] = h
+    for i, bound in enumerate(buckets):
+        if value <= bound:
+            h[i] += 1
+            break
+    else:
+        h[len(buckets)] += 1
+    h[len(buckets) + 1] += value
+
+def _format_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in items) + '}'
+
+def render_metrics():
+    """Merge all thread shards and render them in the Prometheus text exposition format."""
+    merged = {}
+    with _metrics_shards_lock:
+        _fold_dead_shards()
+        _metrics_merge(merged, _metrics_retired)
+        for shard in _metrics_shards.values():
+            _metrics_merge(merged, shard)
+    counters = {k: v for k, v in merged.items() if not isinstance(v, list)}
+    histograms = {k: v for k, v in merged.items() if isinstance(v, list)}
+
+    # Point-in-time gauges
+    with generation_lock:
+        gen_active = {}
+        for (_, kind), active in generation_in_progress.items():
+            if active:
+                gen_active[kind] = gen_active.get(kind, 0) + 1
+    started = sum(v for (n, _), v in counters.items() if n == 'generation_started_total')
+    finished = sum(v for (n, _), v in counters.items() if n == 'generation_finished_total')
+
+    lines = []
+    seen = set()
+
+    def header(name, kind=None, text=None):
+        if name in seen:
+            return
+        seen.add(name)
+        kind_, text_ = METRIC_HELP.get(name, (kind or 'untyped', text or name))
+        lines.append(f'# HELP {name} {text_}')
+        lines.append(f'# TYPE {name} {kind_}')
+
+    for (name, labels), val in sorted(counters.items()):
+        header(name)
+        lines.append(f'{name}{_format_labels(labels)} {val}')
+    for (name, labels), h in sorted(histograms.items(), key=lambda kv: kv[0]):
+        header(name)
+        buckets = h[-1]
+        cumulative = 0
+        for i, bound in enumerate(buckets):
+            cumulative += h[i]
+            lines.append(f'{name}_bucket{_format_labels(labels, [("le", bound)])} {cumulative}')
+        cumulative += h[len(buckets)]
+        lines.append(f'{name}_bucket{_format_labels(labels, [("le", "+Inf")])} {cumulative}')
+        lines.append(f'{name}_sum{_format_labels(labels)} {h[len(buckets) + 1]}')
+        lines.append(f'{name}_count{_format_labels(labels)} {cumulative}')
+
+    header('generation_in_progress', 'gauge', 'Generation jobs currently marked in progress by kind')
+    for kind in ('random', 'smart'):
+        lines.append(f'generation_in_progress{{kind="{kind}"}} {gen_active.get(kind, 0)}')
+    header('generation_queue_size', 'gauge', 'Background generation jobs started but not yet finished')
+    lines.append(f'generation_queue_size {started - finished}')
+    header('generation_quota_tokens', 'gauge', 'Model calls left in the global generation quota by kind')
+    for kind, tokens in sorted(global_quota_levels().items()):
+        lines.append(f'generation_quota_tokens{{kind="{kind}"}} {tokens:.2f}')
+    return "\n".join(lines) + "\n"
+
+# =========================
+#  Profiling
+# =========================
+
+# Runtime profiling settings; adjustable through /admin/profiling. All zero means disabled.
+#  - sample_rate: fraction of requests fully profiled with cProfile (.prof dumps)
+#  - slow_ms: requests slower than this get their stack samples dumped (.folded, flamegraph format)
+#  - slow_sql_ms: statements slower than this are logged with their EXPLAIN QUERY PLAN
+PROFILE_SETTINGS = {
+    'sample_rate': float(os.environ.get("PROFILE_SAMPLE_RATE", "0")),
+    'slow_ms': float(os.environ.get("PROFILE_SLOW_MS", "0")),
+    'slow_sql_ms': float(os.environ.get("PROFILE_SLOW_SQL_MS", "0")),
+}
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+PROFILE_MAX_FILES = int(os.environ.get("PROFILE_MAX_FILES", "200"))
+PROFILE_SAMPLE_INTERVAL = 0.005  # seconds between stack samples of slow-request candidates
+
+_profile_local = threading.local()
+# cProfile hooks the whole interpreter (on 3.12+ a second enable() raises), so one request is profiled at a time.
+_cprofile_lock = threading.Lock()
+_sampler_targets = {}  # thread ident -> {collapsed stack: count}
+_sampler_lock = threading.Lock()
+_sampler_thread = None
+
+def profiling_active():
+    return bool(PROFILE_SETTINGS['sample_rate'] or PROFILE_SETTINGS['slow_ms'] or PROFILE_SETTINGS['slow_sql_ms'])
+
+def _sampler_loop():
+    """Periodically record the Python stack of every registered request thread; exits when idle."""
+    global _sampler_thread
+    while True:
+        with _sampler_lock:
+            if not _sampler_targets:
+                _sampler_thread = None
+                return
+            targets = list(_sampler_targets.items())
+        frames = sys._current_frames()
+        for ident, counts in targets:
+            frame = frames.get(ident)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            if stack:
+                key = ";".join(reversed(stack))
+                counts[key] = counts.get(key, 0) + 1
+        time.sleep(PROFILE_SAMPLE_INTERVAL)
+
+def _start_sampling():
+    global _sampler_thread
+    counts = {}
+    with _sampler_lock:
+        _sampler_targets[threading.get_ident()] = counts
+        if _sampler_thread is None:
+            _sampler_thread = threading.Thread(target=_sampler_loop, daemon=True)
+            _sampler_thread.start()
+    return counts
+
+def _stop_sampling():
+    with _sampler_lock:
+        return _sampler_targets.pop(threading.get_ident(), None)
+
+def _note_slow_sql(conn, sql, params, elapsed):
+    """
+    Called by timed cursors; keeps slow statements (with query plan) for the current request.
+    params is None for executemany(), whose plan is explained with NULLs bound.
     """
-    conn = sqlite3.connect(DATABASE, check_same_thread=False)
+    limit = PROFILE_SETTINGS['slow_sql_ms']
+    log = getattr(_profile_local, 'slow_sql', None)
+    if not limit or log is None or elapsed * 1000 < limit or sql.lstrip().upper().startswith('EXPLAIN'):
+        return
+    if params is None:
+        params = [None] * sql.count('?')
+    try:
+        plan = [tuple(r) for r in sqlite3.Connection.execute(conn, 'EXPLAIN QUERY PLAN ' + sql, params or ())]
+    except Exception as e:
+        plan = [f"EXPLAIN failed: {e}"]
+    log.append((elapsed, sql.strip(), plan))
+
+def _rotate_profile_dir():
+    """Keep only the newest PROFILE_MAX_FILES dumps."""
+    try:
+        paths = [os.path.join(PROFILE_DIR, n) for n in os.listdir(PROFILE_DIR)]
+        paths.sort(key=os.path.getmtime)
+        for path in paths[:-PROFILE_MAX_FILES] if len(paths) > PROFILE_MAX_FILES else []:
+            os.remove(path)
+    except OSError as e:
+        deb_mes("_rotate_profile_dir: %s", e, level=logging.WARNING)
+
+def _profile_request_start():
+    _profile_local.start = time.perf_counter()
+    _profile_local.deferred = False
+    _profile_local.slow_sql = [] if PROFILE_SETTINGS['slow_sql_ms'] else None
+    _profile_local.profiler = None
+    _profile_local.samples = None
+    if (PROFILE_SETTINGS['sample_rate'] and random.random() < PROFILE_SETTINGS['sample_rate']
+            and _cprofile_lock.acquire(blocking=False)):
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            _profile_local.profiler = profiler
+        except ValueError as e:  # another profiling tool is active; skip this sample
+            _cprofile_lock.release()
+            deb_mes("_profile_request_start: cProfile unavailable: %s", e)
+    if _profile_local.profiler is None and PROFILE_SETTINGS['slow_ms']:
+        _profile_local.samples = _start_sampling()
+
+def _profile_request_finish(endpoint):
+    start = getattr(_profile_local, 'start', None)
+    if start is None:
+        return
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    profiler = _profile_local.profiler
+    if profiler is not None:
+        profiler.disable()
+        _profile_local.profiler = None
+        _cprofile_lock.release()
+    samples = _stop_sampling() if _profile_local.samples is not None else None
+    slow_sql = _profile_local.slow_sql
+    _profile_local.start = None
+    _profile_local.slow_sql = None
+
+    slow = PROFILE_SETTINGS['slow_ms'] and elapsed_ms >= PROFILE_SETTINGS['slow_ms']
+    if profiler is None and not (slow and samples) and not slow_sql:
+        return
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        base = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{endpoint}-{int(elapsed_ms)}ms-{threading.get_ident()}")
+        if profiler is not None:
+            profiler.dump_stats(base + ".prof")
+        if slow and samples:
+            with open(base + ".folded", "w") as f:
+                for stack, count in sorted(samples.items(), key=lambda kv: -kv[1]):
+                    f.write(f"{stack} {count}\n")
+        if slow_sql:
+            with open(base + ".sql.log", "w") as f:
+                for elapsed, sql, plan in slow_sql:
+                    f.write(f"-- {elapsed * 1000:.1f} ms\n{sql}\n")
+                    for row in plan:
+                        f.write(f"--   {row}\n")
+                    f.write("\n")
+        _rotate_profile_dir()
+    except Exception as e:
+        deb_mes("_profile_request_finish: failed to write profile dump: %s", e, level=logging.WARNING)
+
+class _TimedCursor(sqlite3.Cursor):
+    """
+    Cursor that records statement time into the sqlite_seconds histogram and the slow-SQL log.
+    SQLite does most of a SELECT's work while rows are stepped, so time spent in fetches counts too: a statement
+    is recorded once its rows are exhausted, or when the cursor runs the next statement, closes or is collected.
+    """
+    _pending = None  # [sql, parameters, op, seconds so far] of the statement still producing rows
+
+    def _spent(self, start, done=False):
+        if self._pending is not None:
+            self._pending[3] += time.perf_counter() - start
+        if done:
+            self._finish()
+
+    def _finish(self):
+        pending, self._pending = self._pending, None
+        if pending is not None:
+            sql, parameters, op, elapsed = pending
+            metric_observe('sqlite_seconds', elapsed, op=op)
+            _note_slow_sql(self.connection, sql, parameters, elapsed)
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        self._pending = [sql, parameters, 'execute', 0.0]
+        start = time.perf_counter()
+        try:
+            super().execute(sql, parameters)
+        except BaseException:
+            self._spent(start, done=True)
+            raise
+        self._spent(start, done=self.description is None)  # no result rows: already ran to completion
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        self._pending = [sql, None, 'executemany', 0.0]
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._spent(start, done=True)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._spent(start, done=row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        start = time.perf_counter()
+        rows = super().fetchmany(size)
+        self._spent(start, done=len(rows) < size)
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._spent(start, done=True)
+        return rows
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._spent(start, done=True)
+            raise
+        self._spent(start)
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        try:
+            self._finish()
+        except Exception:
+            pass
+
+class _AppConnection(sqlite3.Connection):
+    """sqlite3 connection that remembers which database file it belongs to (for sealing the right HMAC)."""
+    db_path = None
+
+class _TimedConnection(_AppConnection):
+    """Connection whose cursors and commits are timed; only used when metrics or slow-SQL logging are on."""
+
+    def cursor(self, factory=_TimedCursor):
+        return super().cursor(factory)
+
+    # sqlite3's own shortcuts create a plain cursor internally, bypassing cursor() above.
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        cursor = self.cursor()
+        cursor.executemany(sql, seq_of_parameters)
+        return cursor
+
+    def commit(self):
+        start = time.perf_counter()
+        try:
+            return super().commit()
+        finally:
+            metric_observe('sqlite_seconds', time.perf_counter() - start, op='commit')
+
+def shard_path(index):
+    """Path of shard file number index, next to DATABASE."""
+    return f"{os.path.splitext(DATABASE)[0]}.shard{index}.db"
+
+def db_path_for_user(user_id, shards=None):
+    """Database file holding user_id's words and suggestions under the given (default: configured) shard count."""
+    shards = STORAGE_SHARDS if shards is None else shards
+    if user_id is None or shards <= 1:
+        return DATABASE
+    return shard_path(int(user_id) % shards)
+
+def all_db_paths(shards=None):
+    """The main database followed by every shard file of the given (default: configured) layout."""
+    shards = STORAGE_SHARDS if shards is None else shards
+    return [DATABASE] + ([shard_path(i) for i in range(shards)] if shards > 1 else [])
+
+def connect_db(path):
+    """Open a sqlite3 connection to path with the app's connection class and Row factory."""
+    factory = _TimedConnection if METRICS_ENABLED or PROFILE_SETTINGS['slow_sql_ms'] else _AppConnection
+    conn = sqlite3.connect(path, check_same_thread=False, factory=factory)
+    conn.db_path = path
     conn.row_factory = sqlite3.Row
     return conn
 
-def deb_mes(msg):
-    """Simple debug print controlled by VERBOSE_LOGGING."""
-    if VERBOSE_LOGGING:
-        print(msg)
+def get_db_connection(user_id=None):
+    """Open a sqlite3 connection using the configured DATABASE path.
+    Uses Row factory so returned rows behave like dicts in code.
+    Pass user_id for anything touching words/suggestions so sharded storage routes to the user's shard;
+    without it the main database (users table) is opened.
+    """
+    return connect_db(db_path_for_user(user_id))
+
+# =========================
+#  Logging
+# =========================
+
+# Records are queued by the calling thread and written by a single listener thread,
+# so a slow stdout consumer never blocks request handlers or generation workers.
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "DEBUG" if VERBOSE_LOGGING else "WARNING").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json")  # 'json' or 'text'
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", "10000"))
+LOG_RATE_LIMIT = int(os.environ.get("LOG_RATE_LIMIT", "20"))  # max records per call site per window
+LOG_RATE_WINDOW = 10.0  # seconds
+
+logger = logging.getLogger("vizsgaprojekt")
+_log_context = threading.local()  # request_id / user_id / job_id of the current thread
+
+def set_log_context(**fields):
+    """Replace the structured context (request_id, user_id, job_id) attached to this thread's records."""
+    _log_context.fields = {k: v for k, v in fields.items() if v is not None}
+
+def clear_log_context():
+    _log_context.fields = {}
+
+class _ContextFilter(logging.Filter):
+    """Copies the calling thread's log context onto the record before it is queued."""
+
+    def filter(self, record):
+        record.context = dict(getattr(_log_context, 'fields', None) or {})
+        return True
+
+class _RateLimitFilter(logging.Filter):
+    """Lets at most LOG_RATE_LIMIT records per call site through per window; reports how many were suppressed."""
+
+    def __init__(self):
+        super().__init__()
+        self._sites = {}  # (pathname, lineno) -> [window_start, passed, suppressed]
+
+    def filter(self, record):
+        now = time.monotonic()
+        key = (record.pathname, record.lineno)
+        state = self._sites.get(key)
+        if state is None or now - state[0] >= LOG_RATE_WINDOW:
+            suppressed = state[2] if state else 0
+            self._sites[key] = [now, 1, 0]
+            if suppressed:
+                record.msg = f"{record.getMessage()} (suppressed {suppressed} similar messages)"
+                record.args = None
+            return True
+        if state[1] < LOG_RATE_LIMIT:
+            state[1] += 1
+            return True
+        state[2] += 1
+        return False
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records (and counts them) instead of blocking when the queue is full."""
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metric_inc('log_records_dropped_total')
+
+class _JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created)) + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "msg": record.getMessage(),
+            "thread": record.threadName,
+        }
+        entry.update(getattr(record, 'context', None) or {})
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class _TextFormatter(logging.Formatter):
+    def format(self, record):
+        line = super().format(record)
+        context = getattr(record, 'context', None)
+        if context:
+            line += " " + " ".join(f"{k}={v}" for k, v in context.items())
+        return line
+
+def setup_logging():
+    """Attach the bounded queue handler to the app logger and start the listener thread. Idempotent."""
+    if getattr(setup_logging, 'listener', None):
+        return
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if LOG_FORMAT == 'json':
+        stream_handler.setFormatter(_JsonFormatter())
+    else:
+        stream_handler.setFormatter(_TextFormatter('%(asctime)s %(levelname)s %(message)s'))
+    queue_handler = _DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(_RateLimitFilter())
+    queue_handler.addFilter(_ContextFilter())
+    logger.addHandler(queue_handler)
+    logger.setLevel(LOG_LEVEL)
+    logger.propagate = False
+    listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    listener.start()
+    setup_logging.listener = listener
+    atexit.register(listener.stop)  # flush what is still queued on shutdown
+
+def deb_mes(msg, *args, level=logging.DEBUG):
+    """
+    Log a message through the asynchronous app logger (default level DEBUG).
+    Pass %-style args instead of pre-formatting so disabled levels cost almost nothing.
+    """
+    if logger.isEnabledFor(level):
+        logger.log(level, msg, *args, stacklevel=2)
+
+setup_logging()
 
 def _hmac_key_bytes():
     """Build HMAC key bytes from environment or app secret."""
     key = os.environ.get('DB_HMAC_KEY') or app.secret_key or ''
     return key.encode('utf-8')
 
-def compute_db_hmac():
+def hmac_path(path=None):
+    """HMAC seal file for a database file (HMAC_FILE for the main database)."""
+    path = path or DATABASE
+    return HMAC_FILE if path == DATABASE else path + ".hmac"
+
+def compute_db_hmac(path=None):
     """Compute HMAC-SHA256 over the database file using the configured key.
     Returns empty string if database file doesn't exist.
     """
+    path = path or DATABASE
     key = _hmac_key_bytes()
-    if not os.path.exists(DATABASE):
+    if not os.path.exists(path):
         return ''
-    with open(DATABASE, "rb") as f:
+    with open(path, "rb") as f:
         data = f.read()
     return hmac.new(key, data, hashlib.sha256).hexdigest()
 
-def write_db_hmac(h):
-    """Write computed HMAC to the HMAC_FILE."""
-    with open(HMAC_FILE, "w") as f:
+def write_db_hmac(h, path=None):
+    """Write computed HMAC to the seal file of path (HMAC_FILE by default)."""
+    with open(hmac_path(path), "w") as f:
         f.write(h)
 
 def verify_db_hmac():
-    """Verify HMAC on startup to detect database integrity changes."""
-    if not os.path.exists(DATABASE):
-        return True
-    current = compute_db_hmac()
-    if not os.path.exists(HMAC_FILE):
-        write_db_hmac(current)
-        return True
-    with open(HMAC_FILE, "r") as f:
-        stored = f.read().strip()
-    if stored != current:
-        raise RuntimeError("Database integrity check failed: HMAC mismatch")
+    """Verify HMAC of the main database and every shard on startup to detect integrity changes."""
+    for path in all_db_paths():
+        if not os.path.exists(path):
+            continue
+        current = compute_db_hmac(path)
+        if not os.path.exists(hmac_path(path)):
+            write_db_hmac(current, path)
+            continue
+        with open(hmac_path(path), "r") as f:
+            stored = f.read().strip()
+        if stored != current:
+            raise RuntimeError(f"Database integrity check failed: HMAC mismatch for {path}")
     return True
 
-def update_db_hmac():
+def update_db_hmac(path=None):
     """Recompute and persist the HMAC after database modifications."""
-    h = compute_db_hmac()
-    write_db_hmac(h)
+    start = time.perf_counter()
+    h = compute_db_hmac(path)
+    write_db_hmac(h, path)
+    metric_observe('hmac_seal_seconds', time.perf_counter() - start)
 
 def commit_and_update(conn):
-    """Commit a sqlite connection, close it and update HMAC afterwards."""
+    """Commit a sqlite connection, close it and update the HMAC of the file it belongs to."""
+    path = getattr(conn, 'db_path', None)
     conn.commit()
     conn.close()
-    update_db_hmac()
+    update_db_hmac(path)
 
 def get_confidence_index(word_row):
     """Calculate a 'confidence index' for a word from its statistics."""
     return (word_row['pass'] * 2) + word_row['passWithHelp'] - word_row['fail'] - (word_row['failWithHelp'] * 2)
 
 def init_db():
-    """Create tables if they don't exist. Idempotent."""
+    """Create tables if they don't exist in the main database and every shard. Idempotent."""
     conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT NOT NULL,
-            password TEXT NOT NULL,
-            theme TEXT DEFAULT 'themeDark'
-        );
-    ''')
+    _create_schema(conn.cursor(), main=True)
+    commit_and_update(conn)
+    check_storage_layout()
+    for path in all_db_paths()[1:]:
+        conn = connect_db(path)
+        _create_schema(conn.cursor(), main=False)
+        commit_and_update(conn)
+
+def _create_schema(cursor, main=True):
+    """Create the tables on one database file; the users table only exists in the main database."""
+    # Only takes effect on a new file; existing ones are converted by `--maintenance full`.
+    cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    if main:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT NOT NULL,
+                password TEXT NOT NULL,
+                theme TEXT DEFAULT 'themeDark'
+            );
+        ''')
+        # Key/value settings describing the on-disk layout (e.g. the shard count).
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS storage_meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+        ''')
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS words (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -124,16 +848,212 @@ def init_db():
             FOREIGN KEY (userID) REFERENCES users(id)
         );
     ''')
+    # Alphabetical per-user listing; lets the streamed endpoints seek to each chunk instead of re-sorting.
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_words_user_word ON words (userID, word)')
     # Table to hold per-user suggestion buffers (random and smart).
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS suggestions (
             userID INTEGER PRIMARY KEY,
             random_buffer TEXT DEFAULT '[]',
             smart_buffer TEXT DEFAULT '[]',
+            touched INTEGER NOT NULL DEFAULT 0,
             FOREIGN KEY (userID) REFERENCES users(id)
         );
     ''')
+    # touched: epoch of the last buffer write, used by maintenance to find abandoned buffers.
+    if 'touched' not in {r[1] for r in cursor.execute('PRAGMA table_info(suggestions)').fetchall()}:
+        cursor.execute('ALTER TABLE suggestions ADD COLUMN touched INTEGER NOT NULL DEFAULT 0')
+    # Append-only log of practice attempts; outcome is 'pass' or 'fail', help is 0/1, ts is epoch seconds.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS practice_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            userID INTEGER NOT NULL,
+            wordID INTEGER NOT NULL,
+            outcome TEXT NOT NULL,
+            help INTEGER NOT NULL DEFAULT 0,
+            ts INTEGER NOT NULL
+        );
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_practice_events_ts ON practice_events (ts)')
+    # Daily/weekly counters per word; wordID 0 holds the per-user total. bucket is the period start (epoch, UTC).
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS practice_rollups (
+            userID INTEGER NOT NULL,
+            wordID INTEGER NOT NULL,
+            period TEXT NOT NULL,
+            bucket INTEGER NOT NULL,
+            pass INTEGER DEFAULT 0,
+            passWithHelp INTEGER DEFAULT 0,
+            fail INTEGER DEFAULT 0,
+            failWithHelp INTEGER DEFAULT 0,
+            PRIMARY KEY (userID, period, wordID, bucket)
+        );
+    ''')
+    # Id of the last practice event already folded into the rollups of this file.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS rollup_state (
+            id INTEGER PRIMARY KEY CHECK (id = 0),
+            last_event_id INTEGER NOT NULL DEFAULT 0
+        );
+    ''')
+    cursor.execute('INSERT OR IGNORE INTO rollup_state (id, last_event_id) VALUES (0, 0)')
+    # Client-generated ids of offline practice results already applied by /sync_scores (dedup on retry).
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS score_sync_ids (
+            userID INTEGER NOT NULL,
+            clientID TEXT NOT NULL,
+            applied_at INTEGER NOT NULL,
+            PRIMARY KEY (userID, clientID)
+        ) WITHOUT ROWID;
+    ''')
+    init_search_index(cursor)
+
+def stored_shard_count():
+    """Shard count the data on disk was written with; None for a fresh database without data."""
+    conn = get_db_connection()
+    row = conn.execute("SELECT value FROM storage_meta WHERE key = 'shards'").fetchone()
+    has_words = conn.execute('SELECT 1 FROM words LIMIT 1').fetchone() is not None
+    conn.close()
+    if row:
+        return int(row['value'])
+    # Databases that predate sharding keep everything in the main file.
+    return 1 if has_words else None
+
+def check_storage_layout():
+    """Record the shard count on first start; refuse to run if STORAGE_SHARDS no longer matches the data."""
+    conn = get_db_connection()
+    recorded = conn.execute("SELECT 1 FROM storage_meta WHERE key = 'shards'").fetchone() is not None
+    conn.close()
+    stored = stored_shard_count()
+    if stored is None or (not recorded and stored == STORAGE_SHARDS):
+        conn = get_db_connection()
+        conn.execute("INSERT INTO storage_meta (key, value) VALUES ('shards', ?)", (str(STORAGE_SHARDS),))
+        commit_and_update(conn)
+    elif stored != STORAGE_SHARDS:
+        raise RuntimeError(f"Database is laid out for {stored} shard(s) but STORAGE_SHARDS={STORAGE_SHARDS}; "
+                           f"run: python app.py --migrate-shards {STORAGE_SHARDS}")
+
+def migrate_shards(target):
+    """
+    Move every user's words, suggestion buffers and practice history from the current on-disk layout to target shards
+    (1 = back to the single database file). Word ids are kept where they don't collide in the target file.
+    Each target file is written in one transaction and sealed; source rows are deleted afterwards.
+    """
+    global STORAGE_SHARDS
+    conn = get_db_connection()
+    _create_schema(conn.cursor(), main=True)
+    commit_and_update(conn)
+    source = stored_shard_count() or 1
+    for path in set(all_db_paths(source)) | set(all_db_paths(target)):
+        conn = connect_db(path)
+        _create_schema(conn.cursor(), main=(path == DATABASE))
+        commit_and_update(conn)
+
+    # Fold every logged attempt into the rollups first: moved events are then marked as already aggregated.
+    flush_practice_events()
+    for path in all_db_paths(source):
+        if os.path.exists(path):
+            aggregate_practice_events(path)
+
+    moved_words = moved_buffers = 0
+    for src_path in all_db_paths(source):
+        if not os.path.exists(src_path):
+            continue
+        src = connect_db(src_path)
+        user_ids = [r[0] for r in src.execute('SELECT DISTINCT userID FROM words UNION SELECT userID FROM suggestions')]
+        movers = [u for u in user_ids if db_path_for_user(u, target) != src_path]
+        by_target = {}
+        for u in movers:
+            by_target.setdefault(db_path_for_user(u, target), []).append(u)
+        for dst_path, users in by_target.items():
+            dst = connect_db(dst_path)
+            for u in users:
+                # Ids are per file, so merging shards can collide; history rows follow a renumbered word.
+                new_ids = {}
+                for w in src.execute('SELECT id, userID, word, translation, pass, passWithHelp, fail, failWithHelp '
+                                     'FROM words WHERE userID = ?', (u,)):
+                    cur = dst.execute('INSERT OR IGNORE INTO words (id, userID, word, translation, pass, passWithHelp, fail, failWithHelp) '
+                                      'VALUES (?, ?, ?, ?, ?, ?, ?, ?)', tuple(w))
+                    if cur.rowcount == 0:
+                        cur = dst.execute('INSERT INTO words (userID, word, translation, pass, passWithHelp, fail, failWithHelp) '
+                                          'VALUES (?, ?, ?, ?, ?, ?, ?)', tuple(w)[1:])
+                        new_ids[w['id']] = cur.lastrowid
+                    moved_words += 1
+                for b in src.execute('SELECT userID, random_buffer, smart_buffer, touched FROM suggestions WHERE userID = ?', (u,)):
+                    dst.execute('INSERT OR REPLACE INTO suggestions (userID, random_buffer, smart_buffer, touched) VALUES (?, ?, ?, ?)', tuple(b))
+                    moved_buffers += 1
+                dst.executemany('INSERT INTO practice_events (userID, wordID, outcome, help, ts) VALUES (?, ?, ?, ?, ?)',
+                                ((r[0], new_ids.get(r[1], r[1])) + tuple(r)[2:] for r in
+                                 src.execute('SELECT userID, wordID, outcome, help, ts FROM practice_events WHERE userID = ?', (u,))))
+                dst.executemany('INSERT OR IGNORE INTO score_sync_ids (userID, clientID, applied_at) VALUES (?, ?, ?)',
+                                src.execute('SELECT userID, clientID, applied_at FROM score_sync_ids WHERE userID = ?', (u,)))
+                dst.executemany(ROLLUP_UPSERT_SQL,
+                                ((r[0], new_ids.get(r[1], r[1])) + tuple(r)[2:] for r in
+                                 src.execute('SELECT userID, wordID, period, bucket, pass, passWithHelp, fail, failWithHelp '
+                                             'FROM practice_rollups WHERE userID = ?', (u,))))
+            dst.execute('UPDATE rollup_state SET last_event_id = (SELECT COALESCE(MAX(id), 0) FROM practice_events) WHERE id = 0')
+            commit_and_update(dst)
+        for u in movers:
+            src.execute('DELETE FROM words WHERE userID = ?', (u,))
+            src.execute('DELETE FROM suggestions WHERE userID = ?', (u,))
+            src.execute('DELETE FROM practice_events WHERE userID = ?', (u,))
+            src.execute('DELETE FROM practice_rollups WHERE userID = ?', (u,))
+            src.execute('DELETE FROM score_sync_ids WHERE userID = ?', (u,))
+        commit_and_update(src)
+
+    STORAGE_SHARDS = target
+    conn = get_db_connection()
+    conn.execute("INSERT OR REPLACE INTO storage_meta (key, value) VALUES ('shards', ?)", (str(target),))
     commit_and_update(conn)
+    deb_mes("migrate_shards: %d -> %d shard(s), moved %d words and %d buffers", source, target,
+            moved_words, moved_buffers, level=logging.INFO)
+    return moved_words, moved_buffers
+
+# True once the FTS5 index over words exists; set by init_search_index().
+FTS_AVAILABLE = False
+
+def init_search_index(cursor):
+    """
+    Create the FTS5 index over words.word/translation and the triggers keeping it in sync. Idempotent.
+    Uses an external-content table (no duplicated text), prefix indexes for type-ahead search and
+    remove_diacritics so e.g. 'haz' matches 'ház'. Falls back silently if SQLite lacks FTS5.
+    """
+    global FTS_AVAILABLE
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'words_fts'")
+    existed = cursor.fetchone() is not None
+    try:
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS words_fts USING fts5(
+                word, translation,
+                content='words', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2',
+                prefix='1 2 3'
+            );
+        ''')
+    except sqlite3.OperationalError as e:
+        deb_mes("init_search_index: FTS5 not available, search falls back to LIKE: %s", e, level=logging.WARNING)
+        FTS_AVAILABLE = False
+        return
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS words_fts_ai AFTER INSERT ON words BEGIN
+            INSERT INTO words_fts(rowid, word, translation) VALUES (new.id, new.word, new.translation);
+        END;
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS words_fts_ad AFTER DELETE ON words BEGIN
+            INSERT INTO words_fts(words_fts, rowid, word, translation) VALUES ('delete', old.id, old.word, old.translation);
+        END;
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS words_fts_au AFTER UPDATE OF word, translation ON words BEGIN
+            INSERT INTO words_fts(words_fts, rowid, word, translation) VALUES ('delete', old.id, old.word, old.translation);
+            INSERT INTO words_fts(rowid, word, translation) VALUES (new.id, new.word, new.translation);
+        END;
+    ''')
+    if not existed:
+        # Index words that were stored before the FTS table existed.
+        cursor.execute("INSERT INTO words_fts(words_fts) VALUES ('rebuild')")
+    FTS_AVAILABLE = True
 
 # =========================
 #  Ollama / AI integration
@@ -178,16 +1098,43 @@ def _extract_response_from_obj(res):
 
     return None
 
+_ollama_module = None
+_ollama_import_lock = threading.Lock()
+
+def ollama_client():
+    """
+    The ollama module, imported on first use rather than at startup: it pulls in httpx and pydantic,
+    which is the single largest cost of importing app.py.
+    """
+    global _ollama_module
+    if _ollama_module is None:
+        with _ollama_import_lock:
+            if _ollama_module is None:
+                started = time.perf_counter()
+                import ollama
+                _ollama_module = ollama
+                deb_mes("ollama_client: imported ollama in %.0f ms", (time.perf_counter() - started) * 1000,
+                        level=logging.INFO)
+    return _ollama_module
+
 def ollama_generate(prompt):
     """
     Generate using the ollama python client. Wait/poll for a textual response up to OLLAMA_TIMEOUT seconds.
     Returns the response text or None on failure/timeout.
     """
+    start = time.perf_counter()
+    result = _ollama_generate(prompt)
+    metric_observe('ollama_generate_seconds', time.perf_counter() - start,
+                   outcome='ok' if result is not None else 'failed')
+    return result
+
+def _ollama_generate(prompt):
+    """Implementation of ollama_generate without the metrics wrapper."""
     start = time.time()
     try:
-        first = ollama.generate(model=OLLAMA_MODEL, prompt=prompt)
+        first = ollama_client().generate(model=OLLAMA_MODEL, prompt=prompt)
     except Exception as e:
-        deb_mes(f"ollama.generate initial call exception: {e}")
+        deb_mes("ollama.generate initial call exception: %s", e, level=logging.WARNING)
         return None
 
     # quick extraction
@@ -209,10 +1156,10 @@ def ollama_generate(prompt):
                 if r:
                     return r
                 if time.time() - start > OLLAMA_TIMEOUT:
-                    deb_mes("ollama_generate: iterable stream timed out")
+                    deb_mes("ollama_generate: iterable stream timed out", level=logging.WARNING)
                     return None
     except Exception as e:
-        deb_mes(f"ollama_generate: iter consume failed: {e}")
+        deb_mes("ollama_generate: iter consume failed: %s", e, level=logging.WARNING)
 
     # If the object contains an id, poll ollama.get(id) if available
     id_ = None
@@ -224,9 +1171,9 @@ def ollama_generate(prompt):
         except Exception:
             id_ = None
 
-    ollama_get = getattr(ollama, "get", None)
+    ollama_get = getattr(ollama_client(), "get", None)
     if id_ and callable(ollama_get):
-        deb_mes(f"ollama_generate: polling ollama.get for id {id_}")
+        deb_mes("ollama_generate: polling ollama.get for id %s", id_)
         while time.time() - start <= OLLAMA_TIMEOUT:
             try:
                 polled = ollama_get(id_)
@@ -234,7 +1181,7 @@ def ollama_generate(prompt):
                 if r:
                     return r
             except Exception as e:
-                deb_mes(f"ollama.get exception while polling id {id_}: {e}")
+                deb_mes("ollama.get exception while polling id %s: %s", id_, e, level=logging.WARNING)
             time.sleep(1.0)
 
     # Retry generate calls until timeout
@@ -242,22 +1189,23 @@ def ollama_generate(prompt):
     while time.time() - start <= OLLAMA_TIMEOUT:
         try:
             deb_mes("ollama_generate: retrying ollama.generate to wait for completion")
-            candidate = ollama.generate(model=OLLAMA_MODEL, prompt=prompt)
+            candidate = ollama_client().generate(model=OLLAMA_MODEL, prompt=prompt)
             r = _extract_response_from_obj(candidate)
             if r:
                 return r
         except Exception as e:
-            deb_mes(f"ollama.generate retry exception: {e}")
+            deb_mes("ollama.generate retry exception: %s", e, level=logging.WARNING)
         time.sleep(retry_sleep)
 
-    deb_mes("ollama_generate: timed out without receiving response")
+    deb_mes("ollama_generate: timed out without receiving response", level=logging.WARNING)
     return None
 
-def parse_ai_pairs(text):
+def parse_ai_pairs(text, count=4, min_count=None):
     """
     Parse AI output into a list of (english, hungarian) pairs.
     Expected format: lines of "word:translation".
-    Accepts minor numbering/punctuation. Returns list only if exactly 4 valid pairs are parsed.
+    Accepts minor numbering/punctuation. Returns the list only if it has between min_count (default: count)
+    and count valid pairs, so chatty or truncated answers are rejected.
     """
     if not text:
         return []
@@ -272,71 +1220,262 @@ def parse_ai_pairs(text):
         hun = hun.strip().strip('.,;:')
         if eng and hun:
             pairs.append({"word": eng, "translation": hun})
-    if len(pairs) == 4:
+    if (count if min_count is None else min_count) <= len(pairs) <= count:
         return pairs
-    deb_mes(f"parse_ai_pairs: expected 4 pairs, got {len(pairs)}; raw: {text[:500]!r}")
+    metric_inc('parse_ai_pairs_failures_total')
+    deb_mes("parse_ai_pairs: expected %d pairs, got %d; raw: %r", count, len(pairs), text[:500])
     return []
 
-def ai_generate_random_pairs(user_id):
-    """
-    Generate 4 random pairs via AI, then filter out words already present for the user.
-    Returns list of pairs (may be less than 4 if filtering removed some) or None on failure.
-    """
-    out = ollama_generate(
-        "Give me 4 completely random English word. Also give the words' translation in Hungarian, "
+# Per (user, kind) moving average of the share of generated pairs that survive filtering.
+# Users with big vocabularies get a lower yield, so their requests ask for more pairs up front.
+_suggestion_yield = {}
+_recent_suggestions = {}  # user_id -> recently generated words (newest last), for the exclusion hint
+_yield_lock = threading.Lock()
+YIELD_SMOOTHING = 0.3  # weight of the newest observation
+MIN_YIELD = 0.2  # never plan for less, so one call never asks for more than target / MIN_YIELD pairs
+
+def record_yield(user_id, kind, fresh, parsed):
+    """Fold one call's outcome (fresh of parsed pairs were new) into the user's yield estimate."""
+    with _yield_lock:
+        previous = _suggestion_yield.get((user_id, kind), 1.0)
+        _suggestion_yield[(user_id, kind)] = (1 - YIELD_SMOOTHING) * previous + YIELD_SMOOTHING * (fresh / parsed)
+    metric_observe('suggestion_yield_ratio', fresh / parsed, buckets=YIELD_BUCKETS, kind=kind)
+
+def request_size(user_id, kind, needed):
+    """Pairs to ask for so that, at the user's yield so far, about `needed` of them are new."""
+    with _yield_lock:
+        expected = max(MIN_YIELD, _suggestion_yield.get((user_id, kind), 1.0))
+    return max(needed, min(SUGGESTION_MAX_REQUEST, math.ceil(needed / expected)))
+
+def remember_suggestions(user_id, words):
+    with _yield_lock:
+        recent = _recent_suggestions.setdefault(user_id, [])
+        recent.extend(words)
+        del recent[:-EXCLUSION_HINT_WORDS]
+
+def exclusion_hint(user_id, known):
+    """Short list of words the model should not repeat: recent suggestions first, then a sample of known words."""
+    with _yield_lock:
+        recent = list(reversed(_recent_suggestions.get(user_id, [])))
+    words = recent[:EXCLUSION_HINT_WORDS // 2]
+    rest = [w for w in known if w not in words]
+    words += random.sample(rest, min(len(rest), EXCLUSION_HINT_WORDS - len(words)))
+    return ", ".join(words)
+
+def random_pairs_prompt(count, hint):
+    prompt = (
+        f"Give me {count} completely random English words. Also give the words' translation in Hungarian, "
         "separate the word and it's translation by a \":\". Begin the next word in a new line. "
         "Don't think for long. Pick words that have exact translations."
     )
-    if out is None:
-        return None
-    parsed = parse_ai_pairs(out)
-    if not parsed:
-        return None
+    return prompt + (f" Do not use any of these words: {hint}." if hint else "")
 
-    # Filter out words already in user's dictionary (case-insensitive)
-    filtered = []
-    existing = _get_user_words_set_lower(user_id)
-    for p in parsed:
-        if p['word'].strip().lower() in existing:
-            deb_mes(f"ai_generate_random_pairs: removing already-known word '{p['word']}' for user {user_id}")
+def smart_pairs_prompt(count, hint, sample):
+    prompt = (
+        f"Give me {count} completely random English words that match the commonness/level "
+        "of the given words. Also give the words' translation in Hungarian, separate the word and the translation "
+        "by a \":\". Begin the next word in a new line. The given words are: [{}]. "
+        "Don't think for long. Pick words that have exact translations."
+    ).format(", ".join(sample))
+    return prompt + (f" Do not use any of these words: {hint}." if hint else "")
+
+def plan_new_pairs(user_id, kind, make_prompt):
+    """
+    The steps of generate_new_pairs() as a generator, so a sync and an async driver can share them:
+    it yields each prompt for the model and is sent back the model's text (None on failure).
+    Its return value is generate_new_pairs()'s result.
+    """
+    known = _get_user_words_set_lower(user_id)
+    seen = known | {i['word'].strip().lower() for i in read_buffer(user_id, kind)}
+    fresh = []
+    answered = False
+    for attempt in range(2):  # first call plus one top-up
+        if attempt and not take_generation_token(user_id, kind):
+            break  # the first call was paid for by the caller; the top-up is only made within quota
+        needed = SUGGESTION_TARGET - len(fresh)
+        count = request_size(user_id, kind, needed)
+        out = yield make_prompt(count, exclusion_hint(user_id, known))
+        metric_inc('suggestion_model_calls_total', kind=kind, call='first' if attempt == 0 else 'top_up')
+        if out is None:
+            break  # model unavailable; the generate call already spent its retries
+        # Larger requests may come back a pair or two short; the top-up covers that.
+        parsed = parse_ai_pairs(out, count, min_count=max(1, count - count // 4))
+        if not parsed:
             continue
-        filtered.append(p)
-    # Return filtered list (may be empty)
-    return filtered
+        answered = True
+        new = []
+        for p in parsed:
+            key = p['word'].strip().lower()
+            if key in seen:
+                deb_mes("generate_new_pairs: removing already-known word '%s' for user %s", p['word'], user_id)
+                continue
+            seen.add(key)
+            new.append(p)
+        record_yield(user_id, kind, len(new), len(parsed))
+        add_to_pool(kind, parsed)
+        remember_suggestions(user_id, [p['word'] for p in parsed])
+        fresh.extend(new)
+        if len(fresh) >= SUGGESTION_TARGET:
+            break
+    metric_inc('suggestion_pairs_delivered_total', len(fresh), kind=kind)
+    return fresh if answered else None
+
+def advance_plan(plan, out):
+    """Send out into a plan_new_pairs() generator: (False, next prompt) or (True, result) once it finished."""
+    try:
+        return False, plan.send(out)
+    except StopIteration as done:
+        return True, done.value
 
-def ai_generate_smart_pairs(user_id, user_words):
+def generate_new_pairs(user_id, kind, make_prompt):
     """
-    Generate 4 smart pairs via AI, using up to 40 sample words if user has many.
-    Filter out words already present for the user before returning.
+    Ask the model for enough pairs that SUGGESTION_TARGET of them are new to the user, sized by the
+    user's historical yield, and top up with at most one follow-up call when filtering left too few.
+    Words already known or already waiting in the buffer are filtered out.
+    Returns the new pairs (possibly fewer than the target, possibly empty) or None if every call failed.
     """
+    plan = plan_new_pairs(user_id, kind, make_prompt)
+    done, value = advance_plan(plan, None)
+    while not done:
+        done, value = advance_plan(plan, ollama_generate(value))
+    return value
+
+def pairs_prompt_builder(kind, user_words=None):
+    """make_prompt(count, hint) for generate_new_pairs(); smart prompts include up to 40 of the user's words."""
+    if kind == 'random':
+        return random_pairs_prompt
     # If user has more than 40 words, pick 40 randomly for the prompt
-    sample = user_words
-    if len(user_words) > 40:
-        sample = random.sample(user_words, 40)
-    words_list = ", ".join(sample) if sample else ""
-    prompt = (
-        "A set of words is given. Give me 4 completely random English word that matches the commonness/level "
-        "of the given words. Also give the words' translation in Hungarian, separate the word and the translation "
-        "by a \":\". Begin the next word in a new line. The given words are: [{}]. "
-        "Don't think for long. Pick words that have exact translations."
-    ).format(words_list)
+    sample = user_words or []
+    if len(sample) > 40:
+        sample = random.sample(sample, 40)
+    return lambda count, hint: smart_pairs_prompt(count, hint, sample)
 
-    out = ollama_generate(prompt)
-    if out is None:
+def ai_generate_random_pairs(user_id):
+    """
+    Generate SUGGESTION_TARGET random pairs the user doesn't know yet via AI (see generate_new_pairs).
+    Returns list of pairs (may be shorter, even empty, after filtering) or None on failure.
+    """
+    return generate_new_pairs(user_id, 'random', pairs_prompt_builder('random'))
+
+def ai_generate_smart_pairs(user_id, user_words):
+    """
+    Generate level-matched pairs via AI, using up to 40 sample words if user has many.
+    Filters out words already present for the user, like ai_generate_random_pairs.
+    """
+    return generate_new_pairs(user_id, 'smart', pairs_prompt_builder('smart', user_words))
+
+# =========================
+#  Offline dictionary
+# =========================
+
+_dictionary = None
+_dictionary_lock = threading.Lock()
+
+def build_dictionary_db():
+    """
+    (Re)build DICTIONARY_DB from the bundled DICTIONARY_SOURCE word list when it is missing or older.
+    Source lines are 'english<TAB>hungarian<TAB>band'; '#' lines are comments. Built into a temp file
+    and swapped in atomically so concurrent readers never see a half-written database.
+    """
+    if not os.path.exists(DICTIONARY_SOURCE):
+        return False
+    if os.path.exists(DICTIONARY_DB) and os.path.getmtime(DICTIONARY_DB) >= os.path.getmtime(DICTIONARY_SOURCE):
+        return True
+    tmp = DICTIONARY_DB + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    rows = []
+    with open(DICTIONARY_SOURCE, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip() or line.startswith('#'):
+                continue
+            parts = line.rstrip('\n').split('\t')
+            if len(parts) < 3:
+                continue
+            try:
+                rows.append((parts[0].strip(), parts[1].strip(), int(parts[2])))
+            except ValueError:
+                continue
+    conn = sqlite3.connect(tmp)
+    conn.execute('''
+        CREATE TABLE dictionary (
+            word TEXT PRIMARY KEY,
+            translation TEXT NOT NULL,
+            band INTEGER NOT NULL
+        ) WITHOUT ROWID;
+    ''')
+    conn.executemany('INSERT OR IGNORE INTO dictionary (word, translation, band) VALUES (?, ?, ?)', rows)
+    conn.execute('CREATE INDEX dictionary_band ON dictionary(band)')
+    conn.commit()
+    conn.close()
+    os.replace(tmp, DICTIONARY_DB)
+    deb_mes("build_dictionary_db: imported %d entries into %s", len(rows), DICTIONARY_DB, level=logging.INFO)
+    return True
+
+def load_dictionary():
+    """
+    Return the in-memory dictionary index, loading it from DICTIONARY_DB on first use:
+    {'bands': {band: [(word, translation), ...]}, 'band_of': {word_lower: band}}. None if unavailable.
+    """
+    global _dictionary
+    if _dictionary is not None:
+        return _dictionary or None
+    with _dictionary_lock:
+        if _dictionary is None:
+            bands, band_of = {}, {}
+            try:
+                if build_dictionary_db():
+                    conn = sqlite3.connect(DICTIONARY_DB)
+                    for word, translation, band in conn.execute('SELECT word, translation, band FROM dictionary'):
+                        bands.setdefault(band, []).append((word, translation))
+                        band_of[word.lower()] = band
+                    conn.close()
+            except Exception as e:
+                deb_mes("load_dictionary: offline dictionary unavailable: %s", e, level=logging.WARNING)
+            _dictionary = {'bands': bands, 'band_of': band_of} if bands else {}
+    return _dictionary or None
+
+def dictionary_suggestion(user_id, level_matched=False, existing=None):
+    """
+    Pick an offline suggestion the user doesn't know yet.
+    Random mode draws from every band; level-matched mode draws from the median band of the user's
+    known dictionary words and the next harder one. Returns a suggestion dict or None.
+    """
+    d = load_dictionary()
+    if not d:
         return None
-    parsed = parse_ai_pairs(out)
-    if not parsed:
+    if existing is None:
+        existing = _get_user_words_set_lower(user_id)
+    bands = sorted(d['bands'])
+    if level_matched:
+        known = sorted(d['band_of'][w] for w in existing if w in d['band_of'])
+        level = known[len(known) // 2] if known else bands[0]
+        bands = [b for b in bands if level <= b <= level + 1] or bands
+    pool_size = sum(len(d['bands'][b]) for b in bands)
+    # Random probing is O(1) while most words are unknown; fall back to a full scan when it keeps missing.
+    for _ in range(16):
+        i = random.randrange(pool_size)
+        for b in bands:
+            if i < len(d['bands'][b]):
+                word, translation = d['bands'][b][i]
+                break
+            i -= len(d['bands'][b])
+        if word.lower() not in existing:
+            return {"word": word, "translation": translation, "band": b, "source": "dictionary"}
+    candidates = [(w, t, b) for b in bands for w, t in d['bands'][b] if w.lower() not in existing]
+    if not candidates:
         return None
+    word, translation, b = random.choice(candidates)
+    return {"word": word, "translation": translation, "band": b, "source": "dictionary"}
 
-    # Filter against user's existing words
-    filtered = []
-    existing = _get_user_words_set_lower(user_id)
-    for p in parsed:
-        if p['word'].strip().lower() in existing:
-            deb_mes(f"ai_generate_smart_pairs: removing already-known word '{p['word']}' for user {user_id}")
-            continue
-        filtered.append(p)
-    return filtered
+def _dictionary_response(user_id, level_matched):
+    """jsonify()-ed dictionary suggestion for the recommend endpoints, or None if nothing is left."""
+    if SUGGESTION_SOURCE == 'off':
+        return None
+    item = dictionary_suggestion(user_id, level_matched)
+    if not item:
+        return None
+    return jsonify({"status": "success", "word": item['word'], "translation": item['translation'], "source": "dictionary"}), 200
 
 # =========================
 #  Suggestion buffer and concurrency control
@@ -353,8 +1492,51 @@ def is_generating(user_id, kind):
     with generation_lock:
         return generation_in_progress.get((user_id, kind), False)
 
+# Long-poll support: a version number per (user_id, kind) bumped whenever items are appended to the
+# buffer or a generation finishes. Waiters remember the version they saw and sleep on the condition
+# until it changes, so no wakeup between "buffer empty" and "start waiting" can be missed.
+buffer_cond = threading.Condition()
+buffer_versions = {}
+async_buffer_waiters = {}  # (user_id, kind) -> set of (event loop, future) from await_buffer()
+
+def buffer_version(user_id, kind):
+    with buffer_cond:
+        return buffer_versions.get((user_id, kind), 0)
+
+def notify_buffer(user_id, kind):
+    with buffer_cond:
+        key = (user_id, kind)
+        buffer_versions[key] = buffer_versions.get(key, 0) + 1
+        buffer_cond.notify_all()
+        waiters = async_buffer_waiters.pop(key, ())
+    for loop, fut in waiters:
+        loop.call_soon_threadsafe(_wake_async_waiter, fut)
+
+def wait_for_buffer(user_id, kind, since, timeout):
+    """Block up to timeout seconds until the (user_id, kind) buffer version differs from since."""
+    key = (user_id, kind)
+    with buffer_cond:
+        return buffer_cond.wait_for(lambda: buffer_versions.get(key, 0) != since, timeout)
+
+def wait_and_pop(user_id, kind, since, wait):
+    """
+    Hold a request while background generation for (user_id, kind) runs, then pop the first new item.
+    Returns the item, or None if the wait timed out or generation produced nothing usable.
+    """
+    deadline = time.monotonic() + min(wait, LONGPOLL_MAX_WAIT)
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or not wait_for_buffer(user_id, kind, since, remaining):
+            return None
+        since = buffer_version(user_id, kind)
+        item, used = pop_from_buffer(user_id, kind)
+        if item:
+            return item
+        if not is_generating(user_id, kind):
+            return None
+
 def get_suggestion_row(user_id):
-    conn = get_db_connection()
+    conn = get_db_connection(user_id)
     cursor = conn.cursor()
     cursor.execute('SELECT random_buffer, smart_buffer FROM suggestions WHERE userID = ?', (user_id,))
     row = cursor.fetchone()
@@ -363,9 +1545,10 @@ def get_suggestion_row(user_id):
 
 def ensure_suggestion_row(user_id):
     """Ensure suggestions row exists for user."""
-    conn = get_db_connection()
+    conn = get_db_connection(user_id)
     cursor = conn.cursor()
-    cursor.execute('INSERT OR IGNORE INTO suggestions (userID, random_buffer, smart_buffer) VALUES (?, ?, ?)', (user_id, '[]', '[]'))
+    cursor.execute('INSERT OR IGNORE INTO suggestions (userID, random_buffer, smart_buffer, touched) VALUES (?, ?, ?, ?)',
+                   (user_id, '[]', '[]', int(time.time())))
     commit_and_update(conn)
 
 def read_buffer(user_id, kind):
@@ -384,10 +1567,11 @@ def read_buffer(user_id, kind):
 
 def write_buffer(user_id, kind, items):
     """Overwrite buffer with items (list)"""
-    conn = get_db_connection()
+    conn = get_db_connection(user_id)
     cursor = conn.cursor()
     col = 'random_buffer' if kind == 'random' else 'smart_buffer'
-    cursor.execute(f'UPDATE suggestions SET {col} = ? WHERE userID = ?', (json.dumps(items, ensure_ascii=False), user_id))
+    cursor.execute(f'UPDATE suggestions SET {col} = ?, touched = ? WHERE userID = ?',
+                   (json.dumps(items, ensure_ascii=False), int(time.time()), user_id))
     commit_and_update(conn)
 
 def append_to_buffer(user_id, kind, items):
@@ -398,11 +1582,12 @@ def append_to_buffer(user_id, kind, items):
     existing = _get_user_words_set_lower(user_id)
     new_items = [i for i in items if i['word'].strip().lower() not in existing]
     if not new_items:
-        deb_mes(f"append_to_buffer: nothing new to append for user {user_id} kind {kind}")
+        deb_mes("append_to_buffer: nothing new to append for user %s kind %s", user_id, kind)
         return
     buf = read_buffer(user_id, kind)
     buf.extend(new_items)
     write_buffer(user_id, kind, buf)
+    notify_buffer(user_id, kind)
 
 def pop_from_buffer(user_id, kind):
     """
@@ -411,6 +1596,7 @@ def pop_from_buffer(user_id, kind):
     Returns (item or None, buffer_was_non_empty_bool).
     """
     buf = read_buffer(user_id, kind)
+    metric_observe('suggestion_buffer_depth', len(buf), buckets=DEPTH_BUCKETS, kind=kind)
     if not buf:
         return None, False
 
@@ -421,7 +1607,7 @@ def pop_from_buffer(user_id, kind):
     for idx, item in enumerate(buf):
         wlower = item.get('word', '').strip().lower()
         if wlower in existing:
-            deb_mes(f"pop_from_buffer: removing already-known buffered word '{item.get('word')}' for user {user_id}")
+            deb_mes("pop_from_buffer: removing already-known buffered word '%s' for user %s", item.get('word'), user_id)
             continue
         # first not-known item: return it, and keep remaining items
         popped_item = item
@@ -439,7 +1625,7 @@ def pop_from_buffer(user_id, kind):
 
 def _get_user_words_set_lower(user_id):
     """Return a set of user's words (lowercased, stripped) for quick membership checks."""
-    conn = get_db_connection()
+    conn = get_db_connection(user_id)
     cur = conn.cursor()
     cur.execute('SELECT word FROM words WHERE userID = ?', (user_id,))
     rows = cur.fetchall()
@@ -452,8 +1638,13 @@ def generate_and_append_for_user(user_id, kind, user_words=None):
     Respects generation_in_progress to avoid duplicates. Filters out already-known words.
     """
     if is_generating(user_id, kind):
-        deb_mes(f"Generation already in progress for user {user_id} kind {kind}")
+        deb_mes("Generation already in progress for user %s kind %s", user_id, kind)
         return
+    if not take_generation_token(user_id, kind):
+        return  # over quota: the buffer refills on a later request
+    metric_inc('generation_started_total', kind=kind)
+    prev_context = getattr(_log_context, 'fields', None) or {}
+    set_log_context(request_id=prev_context.get('request_id'), user_id=user_id, job_id=f"gen-{kind}-{uuid.uuid4().hex[:8]}")
     try:
         mark_generation(user_id, kind, True)
         if kind == 'random':
@@ -462,17 +1653,517 @@ def generate_and_append_for_user(user_id, kind, user_words=None):
             new_items = ai_generate_smart_pairs(user_id, user_words or [])
         # If AI generation failed, do nothing
         if new_items is None:
-            deb_mes(f"generate_and_append_for_user: AI generation failed for user {user_id} kind {kind}")
+            deb_mes("generate_and_append_for_user: AI generation failed for user %s kind %s", user_id, kind, level=logging.WARNING)
             return
         # If filtered out to empty list, nothing to append
         if not new_items:
-            deb_mes(f"generate_and_append_for_user: no new unique items generated for user {user_id} kind {kind}")
+            deb_mes("generate_and_append_for_user: no new unique items generated for user %s kind %s", user_id, kind)
             return
         append_to_buffer(user_id, kind, new_items)
     except Exception as e:
-        deb_mes(f"Error generating/appending suggestions for user {user_id} kind {kind}: {e}")
+        deb_mes("Error generating/appending suggestions for user %s kind %s: %s", user_id, kind, e, level=logging.ERROR)
     finally:
         mark_generation(user_id, kind, False)
+        notify_buffer(user_id, kind)
+        metric_inc('generation_finished_total', kind=kind)
+        set_log_context(**prev_context)
+
+# =========================
+#  Generation quotas
+# =========================
+# Every model call takes a token from the user's bucket and from the global bucket of its kind, so
+# one user dismissing suggestions in a loop can't monopolize the model. Requests over quota are
+# answered from the shared suggestion pool or the offline dictionary instead.
+
+class _TokenBucket:
+    """Classic token bucket: `rate` tokens per second up to `burst`; callers hold _quota_lock."""
+
+    def __init__(self, rate, burst):
+        self.rate, self.burst = rate, burst
+        self.tokens, self.updated = float(burst), time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self):
+        """Seconds until a whole token is available."""
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate if self.rate > 0 else float('inf')
+
+_quota_buckets = {}  # ('user', user_id, kind) or ('global', kind) -> _TokenBucket
+_quota_lock = threading.Lock()
+QUOTA_MAX_USER_BUCKETS = 10000  # full buckets are dropped past twice this; a full bucket is the same as a new one
+_quota_sweep_at = 2 * QUOTA_MAX_USER_BUCKETS
+
+def _quota_bucket(key, kind, scope):
+    bucket = _quota_buckets.get(key)
+    if bucket is None:
+        per_minute, burst = GENERATION_QUOTAS[kind][scope]
+        bucket = _quota_buckets[key] = _TokenBucket(per_minute / 60.0, burst)
+    return bucket
+
+def _sweep_full_quota_buckets(now):
+    """
+    Drop user buckets that have refilled completely. Caller holds _quota_lock. The next sweep waits until the
+    dict has doubled again, so the scan costs O(1) per token taken rather than O(buckets) on every call.
+    """
+    global _quota_sweep_at
+    for key in [k for k, b in _quota_buckets.items() if k[0] == 'user' and b.tokens + (now - b.updated) * b.rate >= b.burst]:
+        del _quota_buckets[key]
+    _quota_sweep_at = 2 * max(len(_quota_buckets), QUOTA_MAX_USER_BUCKETS)
+
+def take_generation_token(user_id, kind):
+    """Take one model call from the user's and the global budget of kind; False (nothing taken) if either is empty."""
+    now = time.monotonic()
+    with _quota_lock:
+        user = _quota_bucket(('user', user_id, kind), kind, 'user')
+        glob = _quota_bucket(('global', kind), kind, 'global')
+        user.refill(now)
+        glob.refill(now)
+        scope = 'user' if user.tokens < 1 else 'global' if glob.tokens < 1 else None
+        if scope is None:
+            user.tokens -= 1
+            glob.tokens -= 1
+        if len(_quota_buckets) > _quota_sweep_at:
+            _sweep_full_quota_buckets(now)
+    if scope:
+        metric_inc('generation_quota_rejected_total', kind=kind, scope=scope)
+        deb_mes("take_generation_token: %s quota exhausted for user %s kind %s", scope, user_id, kind)
+        return False
+    metric_inc('generation_quota_taken_total', kind=kind)
+    return True
+
+def generation_retry_after(user_id, kind):
+    """Whole seconds until the user could make another model call of kind."""
+    now = time.monotonic()
+    with _quota_lock:
+        buckets = [_quota_bucket(('user', user_id, kind), kind, 'user'), _quota_bucket(('global', kind), kind, 'global')]
+        for b in buckets:
+            b.refill(now)
+        wait = max(b.wait_time() for b in buckets)
+    return max(1, math.ceil(min(wait, 3600)))
+
+def global_quota_levels():
+    """Tokens currently left in each global bucket, for /metrics."""
+    now = time.monotonic()
+    with _quota_lock:
+        levels = {}
+        for kind in GENERATION_QUOTAS:
+            b = _quota_bucket(('global', kind), kind, 'global')
+            b.refill(now)
+            levels[kind] = b.tokens
+    return levels
+
+# Recently generated pairs of every user, newest last: suggestions for users who are over quota.
+suggestion_pool = {kind: collections.deque(maxlen=SUGGESTION_POOL_SIZE) for kind in ('random', 'smart')}
+_pool_lock = threading.Lock()
+
+def add_to_pool(kind, pairs):
+    with _pool_lock:
+        suggestion_pool[kind].extend(pairs)
+
+def take_from_pool(user_id, kind):
+    """Remove and return the newest pooled pair that is new to the user, or None."""
+    seen = _get_user_words_set_lower(user_id) | {i['word'].strip().lower() for i in read_buffer(user_id, kind)}
+    with _pool_lock:
+        pool = suggestion_pool[kind]
+        for i in range(len(pool) - 1, -1, -1):
+            if pool[i]['word'].strip().lower() not in seen:
+                item = pool[i]
+                del pool[i]
+                return item
+    return None
+
+def throttled_suggestion(user_id, kind):
+    """
+    What to answer when the buffer is empty and the user is over quota: a pooled pair, a dictionary word,
+    or a 429. Returns (status, payload, retry_after_seconds or None).
+    """
+    item = take_from_pool(user_id, kind)
+    source = 'pool'
+    if item is None and SUGGESTION_SOURCE != 'off':
+        item = dictionary_suggestion(user_id, level_matched=(kind == 'smart'))
+        source = 'dictionary'
+    if item:
+        metric_inc('suggestion_quota_fallback_total', kind=kind, source=source)
+        return 200, {"status": "success", "word": item['word'], "translation": item['translation'], "source": source}, None
+    metric_inc('suggestion_quota_fallback_total', kind=kind, source='none')
+    retry = generation_retry_after(user_id, kind)
+    return 429, {"status": "error", "message": "Suggestion limit reached, please try again shortly.",
+                 "retry_after": retry}, retry
+
+def _throttled_response(user_id, kind):
+    status, payload, retry = throttled_suggestion(user_id, kind)
+    headers = {"Retry-After": str(retry)} if retry else {}
+    return jsonify(payload), status, headers
+
+# =========================
+#  Practice event log
+# =========================
+
+PRACTICE_STATUSES = {
+    'pass': ('pass', 0),
+    'passWithHelp': ('pass', 1),
+    'fail': ('fail', 0),
+    'failWithHelp': ('fail', 1),
+}
+ROLLUP_PERIODS = ('day', 'week')
+
+_event_buffer = []  # (userID, wordID, outcome, help, ts) waiting to be written
+_event_lock = threading.Lock()
+_event_flush_lock = threading.Lock()
+
+def record_practice_event(user_id, word_id, status, ts=None):
+    """Queue one practice attempt for the event log; written by flush_practice_events() in batches."""
+    outcome, used_help = PRACTICE_STATUSES[status]
+    with _event_lock:
+        _event_buffer.append((user_id, word_id, outcome, used_help, int(time.time() if ts is None else ts)))
+        full = len(_event_buffer) >= EVENT_BATCH_SIZE
+    if full:
+        flush_practice_events()
+
+def flush_practice_events():
+    """Write all buffered events, one executemany and one commit per database file. Returns the count."""
+    with _event_flush_lock:
+        with _event_lock:
+            pending = _event_buffer[:]
+            del _event_buffer[:]
+        if not pending:
+            return 0
+        by_path = {}
+        for event in pending:
+            by_path.setdefault(db_path_for_user(event[0]), []).append(event)
+        for path, events in by_path.items():
+            conn = connect_db(path)
+            conn.executemany('INSERT INTO practice_events (userID, wordID, outcome, help, ts) VALUES (?, ?, ?, ?, ?)', events)
+            commit_and_update(conn)
+        metric_inc('practice_events_written_total', len(pending))
+        return len(pending)
+
+def rollup_bucket(ts, period):
+    """Start of the UTC day or week (weeks start on Monday) containing ts."""
+    day = ts - ts % 86400
+    if period == 'day':
+        return day
+    # 1970-01-01 was a Thursday, so Monday-based weeks are offset by 3 days.
+    return day - ((day // 86400 + 3) % 7) * 86400
+
+ROLLUP_UPSERT_SQL = '''
+    INSERT INTO practice_rollups (userID, wordID, period, bucket, pass, passWithHelp, fail, failWithHelp)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (userID, period, wordID, bucket) DO UPDATE SET
+        pass = pass + excluded.pass,
+        passWithHelp = passWithHelp + excluded.passWithHelp,
+        fail = fail + excluded.fail,
+        failWithHelp = failWithHelp + excluded.failWithHelp
+'''
+
+def aggregate_practice_events(path):
+    """
+    Fold events newer than rollup_state.last_event_id into the daily and weekly rollups of one file.
+    Counters and the cursor move in the same transaction, so every event is counted exactly once.
+    Returns the number of events aggregated.
+    """
+    started = time.perf_counter()
+    conn = connect_db(path)
+    last_id = conn.execute('SELECT last_event_id FROM rollup_state WHERE id = 0').fetchone()[0]
+    rows = conn.execute('SELECT id, userID, wordID, outcome, help, ts FROM practice_events WHERE id > ? ORDER BY id',
+                        (last_id,)).fetchall()
+    if not rows:
+        conn.close()
+        return 0
+    deltas = {}
+    for r in rows:
+        column = (2 if r['outcome'] == 'fail' else 0) + (1 if r['help'] else 0)
+        for period in ROLLUP_PERIODS:
+            bucket = rollup_bucket(r['ts'], period)
+            for word_id in (r['wordID'], 0):
+                counts = deltas.setdefault((r['userID'], word_id, period, bucket), [0, 0, 0, 0])
+                counts[column] += 1
+    conn.executemany(ROLLUP_UPSERT_SQL, [key + tuple(counts) for key, counts in deltas.items()])
+    conn.execute('UPDATE rollup_state SET last_event_id = ? WHERE id = 0', (rows[-1]['id'],))
+    commit_and_update(conn)
+    metric_observe('rollup_seconds', time.perf_counter() - started)
+    deb_mes("aggregate_practice_events: %s folded %d events into %d rollup rows", path, len(rows), len(deltas))
+    return len(rows)
+
+def compact_practice_events(path):
+    """Delete raw events older than EVENT_RETENTION_DAYS that are already in the rollups. Returns the count."""
+    cutoff = int(time.time()) - EVENT_RETENTION_DAYS * 86400
+    conn = connect_db(path)
+    cur = conn.execute('DELETE FROM practice_events WHERE ts < ? AND id <= (SELECT last_event_id FROM rollup_state WHERE id = 0)',
+                       (cutoff,))
+    deleted = cur.rowcount
+    if deleted:
+        commit_and_update(conn)
+        metric_inc('practice_events_compacted_total', deleted)
+    else:
+        conn.close()
+    return deleted
+
+def prune_sync_ids(path):
+    """Forget /sync_scores client ids older than SYNC_ID_RETENTION_DAYS; clients retry long before that."""
+    conn = connect_db(path)
+    cur = conn.execute('DELETE FROM score_sync_ids WHERE applied_at < ?', (int(time.time()) - SYNC_ID_RETENTION_DAYS * 86400,))
+    if cur.rowcount:
+        commit_and_update(conn)
+    else:
+        conn.close()
+
+def run_rollups():
+    """Flush buffered events, then aggregate and compact every database file."""
+    flush_practice_events()
+    for path in all_db_paths():
+        if os.path.exists(path):
+            aggregate_practice_events(path)
+            compact_practice_events(path)
+            prune_sync_ids(path)
+
+def practice_event_worker():
+    """Background loop flushing the event buffer every EVENT_FLUSH_INTERVAL and rolling up every ROLLUP_INTERVAL."""
+    next_rollup = time.monotonic() + ROLLUP_INTERVAL
+    while True:
+        time.sleep(EVENT_FLUSH_INTERVAL)
+        try:
+            flush_practice_events()
+            if time.monotonic() >= next_rollup:
+                run_rollups()
+                next_rollup = time.monotonic() + ROLLUP_INTERVAL
+        except Exception as e:
+            deb_mes("practice_event_worker: %s", e, level=logging.ERROR)
+
+atexit.register(flush_practice_events)  # don't lose the last partial batch on a clean shutdown
+
+# =========================
+#  Online backups
+# =========================
+
+class _BackupStarved(Exception):
+    """Raised from the backup progress callback to stop a copy that keeps being restarted by writers."""
+
+def backup_database_file(src_path, dst_path):
+    """
+    Copy one live database into dst_path with the SQLite online backup API, BACKUP_PAGES pages per step
+    and a short pause between steps, so writers only ever wait for a single small step.
+    The result is a consistent snapshot; it gets its own HMAC seal next to it. Returns (bytes, seconds).
+    """
+    start = time.perf_counter()
+    src = sqlite3.connect(src_path, check_same_thread=False)
+    dst = sqlite3.connect(dst_path)
+    state = {'remaining': None, 'restarts': 0}
+
+    def progress(status, remaining, total):
+        # SQLite restarts the copy whenever another connection writes the source; under a constant
+        # write load that could go on forever, so give up stepping after a few restarts.
+        if state['remaining'] is not None and remaining > state['remaining']:
+            state['restarts'] += 1
+            if state['restarts'] > BACKUP_MAX_RESTARTS:
+                raise _BackupStarved()
+        state['remaining'] = remaining
+        time.sleep(BACKUP_STEP_SLEEP)
+
+    try:
+        try:
+            src.backup(dst, pages=BACKUP_PAGES, progress=progress)
+        except _BackupStarved:
+            deb_mes("backup_database_file: %s kept changing, finishing %s in a single step", src_path, dst_path,
+                    level=logging.WARNING)
+            src.backup(dst, pages=-1)
+    finally:
+        dst.close()
+        src.close()
+    write_db_hmac(compute_db_hmac(dst_path), dst_path)
+    return os.path.getsize(dst_path), time.perf_counter() - start
+
+def run_backup():
+    """
+    Snapshot the main database and every shard into BACKUP_DIR/<timestamp>/ with a manifest.json,
+    then prune all but the newest BACKUP_KEEP snapshots. Returns the snapshot directory.
+    """
+    started = time.perf_counter()
+    # Sub-second part and pid keep two backups started in the same second apart (and in age order).
+    now = time.time()
+    name = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}.{int(now % 1 * 1e6):06d}-{os.getpid()}"
+    target = os.path.join(BACKUP_DIR, name)
+    partial = target + ".partial"
+    os.makedirs(partial, exist_ok=True)
+    manifest = {"created": time.strftime('%Y-%m-%dT%H:%M:%S'), "shards": STORAGE_SHARDS, "files": {}}
+    total_bytes = 0
+    for path in all_db_paths():
+        if not os.path.exists(path):
+            continue
+        dst = os.path.join(partial, os.path.basename(path))
+        size, seconds = backup_database_file(path, dst)
+        total_bytes += size
+        with open(hmac_path(dst)) as f:
+            seal = f.read().strip()
+        manifest["files"][os.path.basename(path)] = {"bytes": size, "seconds": round(seconds, 3), "hmac": seal}
+    elapsed = time.perf_counter() - started
+    manifest["seconds"] = round(elapsed, 3)
+    with open(os.path.join(partial, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    # Only complete snapshots get their final name, so a crash never leaves a half backup that looks valid.
+    os.replace(partial, target)
+
+    metric_observe('backup_duration_seconds', elapsed)
+    metric_inc('backup_bytes_total', total_bytes)
+    deb_mes("run_backup: %s written, %d bytes in %.2fs (%.1f MB/s)", target, total_bytes, elapsed,
+            total_bytes / elapsed / 1e6 if elapsed else 0.0, level=logging.INFO)
+    prune_backups()
+    return target
+
+def prune_backups():
+    """
+    Delete all but the newest BACKUP_KEEP snapshot directories, and partial ones untouched for
+    BACKUP_PARTIAL_MAX_AGE (younger ones may belong to a backup still running, e.g. a --backup-now).
+    """
+    if not os.path.isdir(BACKUP_DIR):
+        return
+    entries = sorted(os.listdir(BACKUP_DIR))
+    complete = [e for e in entries if not e.endswith('.partial')]
+    cutoff = time.time() - BACKUP_PARTIAL_MAX_AGE
+    abandoned = [e for e in entries if e.endswith('.partial') and os.path.getmtime(os.path.join(BACKUP_DIR, e)) < cutoff]
+    stale = abandoned + (complete[:-BACKUP_KEEP] if BACKUP_KEEP > 0 else [])
+    for entry in stale:
+        shutil.rmtree(os.path.join(BACKUP_DIR, entry), ignore_errors=True)
+
+def backup_scheduler():
+    """Background loop taking a snapshot every BACKUP_INTERVAL seconds."""
+    while True:
+        time.sleep(BACKUP_INTERVAL)
+        try:
+            run_backup()
+        except Exception as e:
+            deb_mes("backup_scheduler: backup failed: %s", e, level=logging.ERROR)
+
+# =========================
+#  Database maintenance
+# =========================
+# Deleted words and rewritten suggestion buffers leave free pages behind, and every free page is still
+# hashed by compute_db_hmac(). Maintenance returns them to the filesystem, drops buffers nobody uses and
+# refreshes the planner statistics, in short committed steps with MAINTENANCE_STEP_SLEEP pauses between them.
+
+def db_file_report(conn):
+    """File size and free-page share of an open database connection."""
+    pages = conn.execute('PRAGMA page_count').fetchone()[0]
+    free = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    return {"bytes": os.path.getsize(conn.db_path), "pages": pages, "free_pages": free,
+            "fragmentation": round(free / pages, 4) if pages else 0.0}
+
+def _maintenance_step(conn):
+    """Commit one unit of maintenance work, reseal the file and leave the database to request traffic for a moment."""
+    conn.commit()
+    update_db_hmac(conn.db_path)
+    time.sleep(MAINTENANCE_STEP_SLEEP)
+
+def _trimmed_buffer(raw):
+    """raw buffer JSON cut to BUFFER_MAX_ITEMS (unreadable buffers become empty); None if it is fine as it is."""
+    try:
+        items = json.loads(raw)
+    except (TypeError, ValueError):
+        return '[]'
+    if not isinstance(items, list):
+        return '[]'
+    if len(items) <= BUFFER_MAX_ITEMS:
+        return None
+    return json.dumps(items[:BUFFER_MAX_ITEMS], ensure_ascii=False)
+
+def prune_suggestion_buffers(conn):
+    """
+    Delete suggestion rows not written for BUFFER_STALE_DAYS and trim buffers longer than BUFFER_MAX_ITEMS.
+    A trimmed row is only written back if no request changed it meanwhile. Returns (dropped, trimmed).
+    """
+    now = int(time.time())
+    # Rows from before the touched column existed start counting at the first maintenance run that sees them.
+    conn.execute('UPDATE suggestions SET touched = ? WHERE touched = 0', (now,))
+    dropped = conn.execute('DELETE FROM suggestions WHERE touched < ?', (now - BUFFER_STALE_DAYS * 86400,)).rowcount
+    _maintenance_step(conn)
+    trimmed = 0
+    last = -1
+    while True:
+        rows = conn.execute('SELECT userID, random_buffer, smart_buffer FROM suggestions WHERE userID > ? '
+                            'ORDER BY userID LIMIT ?', (last, IMPORT_BATCH_SIZE)).fetchall()
+        if not rows:
+            break
+        last = rows[-1]['userID']
+        for r in rows:
+            random_buf, smart_buf = _trimmed_buffer(r['random_buffer']), _trimmed_buffer(r['smart_buffer'])
+            if random_buf is None and smart_buf is None:
+                continue
+            trimmed += conn.execute('''
+                UPDATE suggestions SET random_buffer = ?, smart_buffer = ?
+                WHERE userID = ? AND random_buffer IS ? AND smart_buffer IS ?
+            ''', (random_buf or r['random_buffer'], smart_buf or r['smart_buffer'],
+                  r['userID'], r['random_buffer'], r['smart_buffer'])).rowcount
+        _maintenance_step(conn)
+    return dropped, trimmed
+
+def maintain_database_file(path, full=False):
+    """
+    Maintain one database file: prune suggestion buffers, release free pages with incremental_vacuum
+    (MAINTENANCE_VACUUM_PAGES per step) and run PRAGMA optimize. full=True instead rebuilds the file with
+    VACUUM, switching it to incremental auto-vacuum, optimizes the search index and runs a complete ANALYZE;
+    that holds the write lock for the whole rebuild, so it is only offered from the command line.
+    Returns a report dict with the before/after db_file_report().
+    """
+    started = time.perf_counter()
+    conn = connect_db(path)
+    try:
+        before = db_file_report(conn)
+        dropped, trimmed = prune_suggestion_buffers(conn)
+        if full:
+            if FTS_AVAILABLE:
+                conn.execute("INSERT INTO words_fts(words_fts) VALUES ('optimize')")
+                _maintenance_step(conn)
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            conn.execute('VACUUM')
+            _maintenance_step(conn)
+        elif conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:  # INCREMENTAL
+            remaining = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            while remaining > 0:
+                # executescript steps the pragma to completion; execute() would free a single page.
+                conn.executescript(f'PRAGMA incremental_vacuum({MAINTENANCE_VACUUM_PAGES})')
+                _maintenance_step(conn)
+                remaining -= MAINTENANCE_VACUUM_PAGES
+        else:
+            deb_mes("maintain_database_file: %s predates incremental auto-vacuum; run --maintenance full once to convert it",
+                    path, level=logging.INFO)
+        conn.execute('PRAGMA analysis_limit = 1000')  # bounds the ANALYZE work PRAGMA optimize may do
+        conn.execute('ANALYZE' if full else 'PRAGMA optimize')
+        _maintenance_step(conn)
+        after = db_file_report(conn)
+    finally:
+        conn.close()
+    return {"path": path, "before": before, "after": after, "buffers_dropped": dropped, "buffers_trimmed": trimmed,
+            "seconds": round(time.perf_counter() - started, 3)}
+
+def run_maintenance(full=False):
+    """Maintain the main database and every shard (see maintain_database_file). Returns the per-file reports."""
+    started = time.perf_counter()
+    reports = []
+    for path in all_db_paths():
+        if not os.path.exists(path):
+            continue
+        report = maintain_database_file(path, full)
+        reports.append(report)
+        metric_inc('maintenance_pages_freed_total', max(0, report['before']['pages'] - report['after']['pages']))
+        metric_inc('maintenance_buffers_pruned_total', report['buffers_dropped'], reason='stale')
+        metric_inc('maintenance_buffers_pruned_total', report['buffers_trimmed'], reason='oversized')
+        deb_mes("run_maintenance: %s %d -> %d bytes, %.1f%% -> %.1f%% free pages, %d stale and %d oversized buffers",
+                path, report['before']['bytes'], report['after']['bytes'], report['before']['fragmentation'] * 100,
+                report['after']['fragmentation'] * 100, report['buffers_dropped'], report['buffers_trimmed'],
+                level=logging.INFO)
+    metric_observe('maintenance_duration_seconds', time.perf_counter() - started)
+    return reports
+
+def maintenance_scheduler():
+    """Background loop running run_maintenance() every MAINTENANCE_INTERVAL seconds."""
+    while True:
+        time.sleep(MAINTENANCE_INTERVAL)
+        try:
+            run_maintenance()
+        except Exception as e:
+            deb_mes("maintenance_scheduler: maintenance failed: %s", e, level=logging.ERROR)
 
 # =========================
 #  Precache on startup
@@ -484,24 +2175,24 @@ def precache_suggestions_for_all_users():
     Uses a ThreadPoolExecutor to limit concurrency (PRECACHE_WORKERS).
     Runs in background as a daemon thread started from __main__.
     """
-    deb_mes("Precache: starting precache for all users")
+    deb_mes("Precache: starting precache for all users", level=logging.INFO)
     conn = get_db_connection()
     c = conn.cursor()
     c.execute('SELECT id FROM users')
     user_rows = c.fetchall()
     conn.close()
     if not user_rows:
-        deb_mes("Precache: no users found, skipping")
+        deb_mes("Precache: no users found, skipping", level=logging.INFO)
         return
 
     user_ids = [r['id'] for r in user_rows]
-    deb_mes(f"Precache: found {len(user_ids)} users, starting ThreadPool with {PRECACHE_WORKERS} workers")
+    deb_mes("Precache: found %d users, starting ThreadPool with %d workers", len(user_ids), PRECACHE_WORKERS, level=logging.INFO)
 
     def task_for_user(uid):
         try:
             ensure_suggestion_row(uid)
             # prepare user's current words for the smart prompt
-            cconn = get_db_connection()
+            cconn = get_db_connection(uid)
             cur = cconn.cursor()
             cur.execute('SELECT word FROM words WHERE userID = ?', (uid,))
             user_words = [r['word'] for r in cur.fetchall()]
@@ -510,7 +2201,7 @@ def precache_suggestions_for_all_users():
             generate_and_append_for_user(uid, 'random', None)
             generate_and_append_for_user(uid, 'smart', user_words)
         except Exception as e:
-            deb_mes(f"Precache: exception for user {uid}: {e}")
+            deb_mes("Precache: exception for user %s: %s", uid, e, level=logging.ERROR)
 
     # Use ThreadPoolExecutor to limit concurrent AI calls
     with ThreadPoolExecutor(max_workers=PRECACHE_WORKERS) as executor:
@@ -520,14 +2211,354 @@ def precache_suggestions_for_all_users():
             try:
                 f.result()
             except Exception as e:
-                deb_mes(f"Precache worker exception: {e}")
+                deb_mes("Precache worker exception: %s", e, level=logging.ERROR)
 
-    deb_mes("Precache: completed precache for all users")
+    deb_mes("Precache: completed precache for all users", level=logging.INFO)
+
+# =========================
+#  Password hashing
+# =========================
+
+class HashingOverloaded(Exception):
+    """Raised when the password hashing executor already has HASH_QUEUE_LIMIT jobs in flight."""
+
+# KDF work runs on a small dedicated pool so a login burst can't occupy every request thread.
+# hashlib's pbkdf2/scrypt release the GIL, so HASH_WORKERS really is the CPU budget for hashing.
+_hash_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix='pwhash')
+_hash_inflight = 0
+_hash_lock = threading.Lock()
+
+def _run_hash_job(op, fn, *args):
+    """Run fn(*args) on the hashing executor and wait for it; raises HashingOverloaded instead of queueing deeply."""
+    global _hash_inflight
+    with _hash_lock:
+        if _hash_inflight >= HASH_QUEUE_LIMIT:
+            metric_inc('password_hash_rejected_total', op=op)
+            raise HashingOverloaded()
+        _hash_inflight += 1
+    submitted = time.perf_counter()
+
+    def job():
+        started = time.perf_counter()
+        metric_observe('password_hash_queue_seconds', started - submitted, op=op)
+        try:
+            return fn(*args)
+        finally:
+            metric_observe('password_hash_seconds', time.perf_counter() - started, op=op)
+
+    try:
+        return _hash_executor.submit(job).result()
+    finally:
+        with _hash_lock:
+            _hash_inflight -= 1
+
+def hash_password(password):
+    """generate_password_hash() with the configured PASSWORD_HASH_METHOD, on the hashing executor."""
+    return _run_hash_job('generate', generate_password_hash, password, PASSWORD_HASH_METHOD)
+
+def verify_password(stored_hash, password):
+    """check_password_hash() on the hashing executor."""
+    return _run_hash_job('check', check_password_hash, stored_hash, password)
+
+def expand_hash_method(method):
+    """
+    The method string werkzeug records in a hash made with method, defaults filled in
+    (e.g. 'scrypt' -> 'scrypt:32768:8:1'), without hashing anything. Follows werkzeug.security's defaults.
+    """
+    name, *args = method.split(':')
+    if name == 'scrypt' and not args:
+        return f"scrypt:{2 ** 15}:8:1"
+    if name == 'pbkdf2' and len(args) < 2:
+        return f"pbkdf2:{args[0] if args else 'sha256'}:{DEFAULT_PBKDF2_ITERATIONS}"
+    return method
+
+_hash_method_prefix = expand_hash_method(PASSWORD_HASH_METHOD)
+
+def password_needs_rehash(stored_hash):
+    """True if stored_hash was made with different KDF parameters than PASSWORD_HASH_METHOD currently gives."""
+    return stored_hash.split('$', 1)[0] != _hash_method_prefix
+
+# =========================
+#  Static asset bundles
+# =========================
+
+# Bundle name -> source files under static/. Bundles are concatenated, minified and written to
+# ASSET_BUILD_DIR as name.<hash>.ext (plus .gz/.br variants); templates link them with asset_url().
+ASSET_BUNDLES = {
+    'base.css': ['styles/global.css', 'styles/responsive.css'],
+    'head.js': ['js/styleLoader.js'],
+    'base.js': ['js/themeChange.js', 'js/menuToggle.js'],
+    'themes/themeDark.css': ['styles/themes/themeDark.css'],
+    'themes/themeDarkGreen.css': ['styles/themes/themeDarkGreen.css'],
+    'themes/themeDarkPurple.css': ['styles/themes/themeDarkPurple.css'],
+    'autonew.css': ['styles/components/autonew.css'],
+    'autonew.js': ['js/autonew.js'],
+    'cards.css': ['styles/components/cards.css'],
+    'cards.js': ['js/cards.js'],
+    'edit.css': ['styles/components/edit.css'],
+    'edit.js': ['js/edit.js'],
+    'landing.css': ['styles/components/landing.css'],
+    'mainMenu.css': ['styles/components/mainMenu.css'],
+    'new.css': ['styles/components/new.css'],
+    'logout.js': ['js/practiceSync.js', 'js/logout.js'],
+    'new.js': ['js/new.js'],
+    'practice.css': ['styles/components/practice.css'],
+    'practice.js': ['js/practiceSync.js', 'js/randomPractice.js'],
+    'settings.css': ['styles/components/settings.css'],
+    'settings.js': ['js/settings.js'],
+    'statistics.css': ['styles/components/statistics.css'],
+    'statistics.js': ['js/statistics.js'],
+}
+ASSET_BUILD_DIR = os.path.join(app.static_folder, 'dist')
+ASSET_MAX_AGE = 365 * 24 * 3600  # hashed names never change content, so clients may cache them for a year
+
+_asset_manifest = None  # bundle name -> hashed file name, loaded/built on first use
+_asset_lock = threading.Lock()
+
+def minify_css(text):
+    """Drop comments and collapse whitespace; spaces around selectors' combinators are left alone."""
+    text = re.sub(r'/\*.*?\*/', '', text, flags=re.S)
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'\s*([{};,])\s*', r'\1', text)
+    # Inside innermost {...} there are only declarations, so "prop: value" can lose its space there.
+    text = re.sub(r'\{[^{}]*\}', lambda m: re.sub(r'\s*:\s*', ':', m.group(0)), text)
+    return text.replace(';}', '}').strip()
+
+def minify_js(text):
+    """
+    Conservative: strip indentation, blank lines and whole-line // comments. Anything inside a line is kept,
+    since a regex can't tell comments from string, template or regex literals. Files with a template literal
+    or a backslash line continuation are left as they are: their literals may span lines, and those lines
+    must keep their indentation, blank lines and // text.
+    """
+    if '`' in text or '\\\n' in text.replace('\r\n', '\n'):
+        return text
+    lines = (line.strip() for line in text.splitlines())
+    return '\n'.join(line for line in lines if line and not line.startswith('//'))
+
+def build_assets():
+    """
+    Concatenate and minify every bundle in ASSET_BUNDLES, write content-hashed files with gzip
+    (and brotli, when the module is installed) variants plus manifest.json, and delete outdated builds.
+    Returns the manifest.
+    """
+    started = time.perf_counter()
+    manifest = {}
+    os.makedirs(ASSET_BUILD_DIR, exist_ok=True)
+    for name, sources in ASSET_BUNDLES.items():
+        parts = []
+        for source in sources:
+            with open(os.path.join(app.static_folder, source), encoding='utf-8') as f:
+                parts.append(f.read())
+        if name.endswith('.css'):
+            body = '\n'.join(minify_css(p) for p in parts)
+        else:
+            # ';' keeps one file's last statement from running into the next file's first.
+            body = ';\n'.join(minify_js(p) for p in parts)
+        data = body.encode('utf-8')
+        stem, ext = os.path.splitext(name)
+        hashed = f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+        manifest[name] = hashed
+        out = os.path.join(ASSET_BUILD_DIR, hashed)
+        if os.path.exists(out):
+            continue
+        os.makedirs(os.path.dirname(out), exist_ok=True)
+        with open(out, 'wb') as f:
+            f.write(data)
+        with open(out + '.gz', 'wb') as f:
+            f.write(gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            with open(out + '.br', 'wb') as f:
+                f.write(brotli.compress(data))
+    with open(os.path.join(ASSET_BUILD_DIR, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+    keep = set(manifest.values())
+    for root, _, files in os.walk(ASSET_BUILD_DIR):
+        for fname in files:
+            rel = os.path.relpath(os.path.join(root, fname), ASSET_BUILD_DIR).replace(os.sep, '/')
+            base = rel[:-3] if rel.endswith(('.gz', '.br')) else rel
+            if base != 'manifest.json' and base not in keep:
+                os.remove(os.path.join(root, fname))
+    deb_mes("build_assets: %d bundles in %.0f ms", len(manifest), (time.perf_counter() - started) * 1000,
+            level=logging.INFO)
+    return manifest
+
+def asset_manifest():
+    """Bundle manifest, built on first use in this process so edited sources always get a new hash."""
+    global _asset_manifest
+    if _asset_manifest is None:
+        with _asset_lock:
+            if _asset_manifest is None:
+                _asset_manifest = build_assets()
+    return _asset_manifest
+
+def asset_url(name):
+    """URL of the fingerprinted build of bundle name, for templates."""
+    return url_for('asset', filename=asset_manifest()[name])
+
+@app.context_processor
+def inject_asset_helpers():
+    themes = {n[len('themes/'):-len('.css')]: asset_url(n) for n in ASSET_BUNDLES if n.startswith('themes/')}
+    return dict(asset_url=asset_url, theme_urls=themes)
+
+@app.route('/assets/<path:filename>')
+def asset(filename):
+    """Serve a fingerprinted bundle, precompressed when the client accepts it, with an immutable cache policy."""
+    if filename not in set(asset_manifest().values()):
+        return jsonify({"status": "error", "message": "Unknown asset!"}), 404
+    chosen, encoding = filename, None
+    best = 0
+    # Highest q-value wins (q=0 means "not acceptable"); brotli first on a tie.
+    for suffix, enc in (('.br', 'br'), ('.gz', 'gzip')):
+        quality = request.accept_encodings[enc]
+        if quality > best and os.path.exists(os.path.join(ASSET_BUILD_DIR, filename + suffix)):
+            chosen, encoding, best = filename + suffix, enc, quality
+    response = send_from_directory(ASSET_BUILD_DIR, chosen, mimetype=mimetypes.guess_type(filename)[0],
+                                   max_age=ASSET_MAX_AGE, conditional=True)
+    response.cache_control.immutable = True
+    response.vary.add('Accept-Encoding')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+# =========================
+#  Streamed JSON lists
+# =========================
+# The big list endpoints write their JSON array STREAM_CHUNK_ROWS rows at a time, as plain tuples rather than
+# sqlite3.Row objects and dicts, so memory stays flat however many words a user has.
+
+if orjson is not None:
+    def encode_json(obj):
+        """obj as compact UTF-8 JSON bytes."""
+        return orjson.dumps(obj)
+else:
+    _json_encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+    def encode_json(obj):
+        """obj as compact UTF-8 JSON bytes."""
+        return _json_encoder.encode(obj).encode('utf-8')
+
+def iter_user_word_rows(user_id, select):
+    """
+    Yield the user's words ordered by word as lists of up to STREAM_CHUNK_ROWS tuples of the select column list,
+    which must start with id, word. Every chunk is a separate query run to completion and paged on (word, id):
+    a statement left open between chunks would hold a SHARED lock and fail every writer of the shard with
+    "database is locked" while a slow client downloads.
+    """
+    conn = get_db_connection(user_id)
+    try:
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        rows = cursor.execute(f'SELECT {select} FROM words WHERE userID = ? ORDER BY word, id LIMIT ?',
+                              (user_id, STREAM_CHUNK_ROWS)).fetchall()
+        while rows:
+            yield rows
+            if len(rows) < STREAM_CHUNK_ROWS:
+                break
+            last_id, last_word = rows[-1][0], rows[-1][1]
+            # word >= ? stands on its own so SQLite seeks idx_words_user_word instead of rescanning from the start.
+            rows = cursor.execute(f'''
+                SELECT {select} FROM words WHERE userID = ? AND word >= ? AND (word > ? OR id > ?)
+                ORDER BY word, id LIMIT ?
+            ''', (user_id, last_word, last_word, last_id, STREAM_CHUNK_ROWS)).fetchall()
+    finally:
+        conn.close()
+
+def stream_json_rows(chunks, columns, key='words', compact=False):
+    """
+    Yield {"status": "success", <key>: [...]} from an iterable of row chunks, each row a tuple in columns order.
+    Rows become objects keyed by columns, or with compact=True bare arrays with the names listed once under "columns".
+    """
+    head = {"status": "success", "columns": columns} if compact else {"status": "success"}
+    yield encode_json(head)[:-1] + b',' + encode_json(key) + b':['
+    sep = b''
+    for rows in chunks:
+        items = rows if compact else [dict(zip(columns, r)) for r in rows]
+        yield sep + encode_json(items)[1:-1]  # one encoder call per chunk, brackets dropped
+        sep = b','
+    yield b']}'
+
+def json_list_response(user_id, select, columns, key='words'):
+    """
+    Stream the user's words as a JSON list response (see iter_user_word_rows for select).
+    ?format=rows selects the compact form (see stream_json_rows); the default is objects.
+    """
+    fmt = request.args.get('format', 'objects')
+    if fmt not in ('objects', 'rows'):
+        return jsonify({"status": "error", "message": "Unknown format!"}), 400
+    chunks = iter_user_word_rows(user_id, select)
+    return Response(stream_with_context(stream_json_rows(chunks, columns, key, compact=(fmt == 'rows'))),
+                    mimetype='application/json')
 
 # =========================
 #         Routes
 # =========================
 
+@app.before_request
+def _metrics_start_timer():
+    g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex[:16]
+    # Reading the session adds "Vary: Cookie", which would stop shared caches from storing static bundles.
+    set_log_context(request_id=g.request_id, user_id=session.get('userID') if request.endpoint != 'asset' else None)
+    if METRICS_ENABLED:
+        g.metrics_start = time.perf_counter()
+    if profiling_active():
+        _profile_request_start()
+
+@app.teardown_request
+def _profile_teardown(exc):
+    if getattr(_profile_local, 'start', None) is not None and not _profile_local.deferred:
+        _profile_request_finish(request.endpoint or 'unmatched')
+    clear_log_context()
+
+@app.after_request
+def _profile_streamed_response(response):
+    # A streamed body runs its queries after teardown, so keep profiling until the server closes the response.
+    if response.is_streamed and getattr(_profile_local, 'start', None) is not None:
+        endpoint = request.endpoint or 'unmatched'
+        _profile_local.deferred = True
+        response.call_on_close(lambda: _profile_request_finish(endpoint))
+    return response
+
+@app.after_request
+def _metrics_record_request(response):
+    start = g.get('metrics_start') if METRICS_ENABLED else None
+    if start is not None:
+        endpoint = request.endpoint or 'unmatched'
+        metric_observe('http_request_duration_seconds', time.perf_counter() - start, endpoint=endpoint)
+        metric_inc('http_requests_total', endpoint=endpoint, method=request.method, status=response.status_code)
+    if 'request_id' in g:
+        response.headers['X-Request-ID'] = g.request_id
+    return response
+
+@app.route('/admin/profiling', methods=['GET', 'POST'])
+def admin_profiling():
+    """
+    Inspect (GET) or change (POST JSON with sample_rate/slow_ms/slow_sql_ms) the profiling settings.
+    Requires the X-Admin-Token header to match ADMIN_TOKEN; disabled (404) when ADMIN_TOKEN is unset.
+    """
+    token = os.environ.get('ADMIN_TOKEN')
+    if not token:
+        return jsonify({"status": "error", "message": "Not found"}), 404
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), token):
+        return jsonify({"status": "error", "message": "Forbidden"}), 403
+    if request.method == 'POST':
+        data = request.get_json() or {}
+        try:
+            for key in PROFILE_SETTINGS:
+                if key in data:
+                    PROFILE_SETTINGS[key] = max(0.0, float(data[key]))
+        except (TypeError, ValueError):
+            return jsonify({"status": "error", "message": "Invalid value!"}), 400
+    return jsonify({"status": "success", "settings": PROFILE_SETTINGS, "dir": PROFILE_DIR})
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus text exposition of the in-process metrics. 404 unless METRICS_ENABLED=1."""
+    if not METRICS_ENABLED:
+        return jsonify({"status": "error", "message": "Metrics are disabled."}), 404
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
 def validateLogin(destination):
     """Helper used by many routes that return templates."""
     if 'userID' not in session:
@@ -593,7 +2624,11 @@ def register():
         conn.close()
         return jsonify({"status": "error", "message": "Username already exists!"}), 400
 
-    hashed_password = generate_password_hash(password)
+    try:
+        hashed_password = hash_password(password)
+    except HashingOverloaded:
+        conn.close()
+        return jsonify({"status": "error", "message": "Server is busy, please try again."}), 429, {"Retry-After": "1"}
     cursor.execute('INSERT INTO users (username, password) VALUES (?, ?)', (username, hashed_password))
     commit_and_update(conn)
     return redirect('/login')
@@ -612,7 +2647,21 @@ def login():
     user = cursor.fetchone()
     conn.close()
 
-    if user and check_password_hash(user['password'], password):
+    try:
+        valid = bool(user) and verify_password(user['password'], password)
+    except HashingOverloaded:
+        return render_template('landing.html', login_error="A szerver túlterhelt, próbáld újra később!"), 429, {"Retry-After": "1"}
+
+    if valid:
+        if password_needs_rehash(user['password']):
+            # KDF settings changed since this hash was made; upgrade it while we have the plaintext.
+            try:
+                new_hash = hash_password(password)
+                conn = get_db_connection()
+                conn.execute('UPDATE users SET password = ? WHERE id = ?', (new_hash, user['id']))
+                commit_and_update(conn)
+            except HashingOverloaded:
+                pass
         session['userID'] = user['id']
         session['theme'] = user['theme'] if 'theme' in user.keys() else 'themeDark'
         ensure_suggestion_row(user['id'])
@@ -625,7 +2674,8 @@ def logout():
     """Clear session values on logout and show landing page with success message."""
     session.pop('userID', None)
     session.pop('theme', None)
-    return render_template('landing.html', login_error="Sikeres kijelentkezés!")
+    # logged_out loads logout.js, which clears the offline practice outbox and cached deck in the browser.
+    return render_template('landing.html', login_error="Sikeres kijelentkezés!", logged_out=True)
 
 @app.route('/add_word', methods=['POST'])
 def add_word():
@@ -641,7 +2691,7 @@ def add_word():
     failWithHelp = int(request.form.get('failWithHelp', 0))
 
     if word and translation:
-        conn = get_db_connection()
+        conn = get_db_connection(user_id)
         cursor = conn.cursor()
         cursor.execute('''
             INSERT INTO words (userID, word, translation, pass, passWithHelp, fail, failWithHelp)
@@ -659,7 +2709,7 @@ def get_random_word():
         return jsonify({"status": "error", "message": "User not logged in!"}), 400
 
     user_id = session['userID']
-    conn = get_db_connection()
+    conn = get_db_connection(user_id)
     cursor = conn.cursor()
     cursor.execute('SELECT * FROM words WHERE userID = ?', (user_id,))
     words = cursor.fetchall()
@@ -678,7 +2728,7 @@ def get_word_count():
     if 'userID' not in session:
         return jsonify({"status": "error", "message": "User not logged in!"}), 400
     user_id = session['userID']
-    conn = get_db_connection()
+    conn = get_db_connection(user_id)
     cursor = conn.cursor()
     cursor.execute('SELECT COUNT(*) FROM words WHERE userID = ?', (user_id,))
     count = cursor.fetchone()[0]
@@ -701,7 +2751,7 @@ def update_score():
     if not status:
         return jsonify({"status": "error", "message": "Missing status!"}), 400
 
-    conn = get_db_connection()
+    conn = get_db_connection(user_id)
     cursor = conn.cursor()
     if status == 'fail':
         cursor.execute('UPDATE words SET fail = fail + 1 WHERE id = ? AND userID = ?', (word_id, user_id))
@@ -714,9 +2764,80 @@ def update_score():
     else:
         conn.close()
         return jsonify({"status": "error", "message": "Unknown status!"}), 400
+    updated = cursor.rowcount
     commit_and_update(conn)
+    if updated:
+        record_practice_event(user_id, int(word_id), status)
     return jsonify({"status": "success", "message": "Score updated successfully!"}), 200
 
+@app.route('/sync_scores', methods=['POST'])
+def sync_scores():
+    """
+    Apply a batch of practice results recorded offline by the client.
+    Body: {"events": [{"id": client-generated id, "user_id": .., "word_id": .., "status": .., "ts": epoch seconds}, ...]}.
+    Ids already applied are skipped, so a batch can be retried safely after a lost response.
+    Invalid events (unknown status, word no longer there, queued by another user of the browser) are dropped
+    rather than failing the batch.
+    """
+    if 'userID' not in session:
+        return jsonify({"status": "error", "message": "User not logged in!"}), 400
+    user_id = session['userID']
+    payload = request.get_json(silent=True)
+    events = payload.get('events') if isinstance(payload, dict) else None
+    if not isinstance(events, list):
+        return jsonify({"status": "error", "message": "Missing events!"}), 400
+    if len(events) > SYNC_MAX_EVENTS:
+        return jsonify({"status": "error", "message": f"At most {SYNC_MAX_EVENTS} events per request!"}), 413
+
+    now = int(time.time())
+    oldest = now - EVENT_RETENTION_DAYS * 86400
+    conn = get_db_connection(user_id)
+    owned = {r['id'] for r in conn.execute('SELECT id FROM words WHERE userID = ?', (user_id,))}
+    deltas = {}
+    applied = []
+    duplicates = rejected = 0
+    for e in events:
+        if not isinstance(e, dict):
+            rejected += 1
+            continue
+        client_id, status = str(e.get('id') or '')[:64], e.get('status')
+        try:
+            owner = int(e.get('user_id'))
+            word_id = int(e.get('word_id'))
+            ts = min(now, max(oldest, int(float(e.get('ts', now)))))
+        except (TypeError, ValueError, OverflowError):
+            rejected += 1
+            continue
+        if not client_id or owner != user_id or status not in PRACTICE_STATUSES or word_id not in owned:
+            rejected += 1
+            continue
+        cur = conn.execute('INSERT OR IGNORE INTO score_sync_ids (userID, clientID, applied_at) VALUES (?, ?, ?)',
+                           (user_id, client_id, now))
+        if cur.rowcount == 0:
+            duplicates += 1
+            continue
+        counts = deltas.setdefault(word_id, dict.fromkeys(PRACTICE_STATUSES, 0))
+        counts[status] += 1
+        applied.append((word_id, status, ts))
+    conn.executemany('UPDATE words SET pass = pass + ?, passWithHelp = passWithHelp + ?, fail = fail + ?, '
+                     'failWithHelp = failWithHelp + ? WHERE id = ? AND userID = ?',
+                     [(c['pass'], c['passWithHelp'], c['fail'], c['failWithHelp'], w, user_id) for w, c in deltas.items()])
+    commit_and_update(conn)
+    for word_id, status, ts in applied:
+        record_practice_event(user_id, word_id, status, ts)
+
+    metric_inc('score_sync_events_total', len(applied), result='applied')
+    metric_inc('score_sync_events_total', duplicates, result='duplicate')
+    metric_inc('score_sync_events_total', rejected, result='rejected')
+    return jsonify({"status": "success", "applied": len(applied), "duplicates": duplicates, "rejected": rejected}), 200
+
+@app.route('/sw.js')
+def service_worker():
+    """The practice service worker; served from the root so its scope covers the whole app."""
+    response = send_from_directory(os.path.join(app.static_folder, 'js'), 'sw.js', mimetype='text/javascript', max_age=0)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
 @app.route('/switch_translation', methods=['POST'])
 def switch_translation():
     """Toggle translation direction for practice. Stored in session as boolean."""
@@ -741,7 +2862,7 @@ def accept_word():
     if word.strip().lower() in existing:
         return jsonify({"status": "error", "message": "Word already exists in your dictionary."}), 400
 
-    conn = get_db_connection()
+    conn = get_db_connection(user_id)
     cursor = conn.cursor()
     cursor.execute('''
         INSERT INTO words (userID, word, translation, pass, passWithHelp, fail, failWithHelp)
@@ -752,14 +2873,14 @@ def accept_word():
     # Trigger background generation for both buffers so the user keeps seeing fresh suggestions.
     try:
         threading.Thread(target=generate_and_append_for_user, args=(user_id, 'random', None), daemon=True).start()
-        conn2 = get_db_connection()
+        conn2 = get_db_connection(user_id)
         cur2 = conn2.cursor()
         cur2.execute('SELECT word FROM words WHERE userID = ?', (user_id,))
         user_words = [r['word'] for r in cur2.fetchall()]
         conn2.close()
         threading.Thread(target=generate_and_append_for_user, args=(user_id, 'smart', user_words), daemon=True).start()
     except Exception as e:
-        deb_mes(f"Error starting background generation threads: {e}")
+        deb_mes("Error starting background generation threads: %s", e, level=logging.ERROR)
 
     return jsonify({"status": "success", "message": "Word accepted and added!"}), 200
 
@@ -767,16 +2888,25 @@ def accept_word():
 def recommend_word():
     """
     Return a suggestion from the per-user random buffer.
+    With SUGGESTION_SOURCE='first' the offline dictionary is tried before the buffer.
     If buffer empty:
-      - If generation in progress: respond with 'busy' so client can wait.
+      - If generation in progress: with ?wait=<seconds> hold the request until the background
+        generation appends items (long-poll), otherwise/after the wait respond with 'busy' (202).
       - Otherwise, attempt synchronous generation (which will filter duplicates).
-      - No fallback words are provided.
+      - If the AI fails, fall back to the offline dictionary (unless SUGGESTION_SOURCE='off').
+      - Over the generation quota, answer from the shared pool or the dictionary, else 429 with Retry-After.
     """
     if 'userID' not in session:
         return jsonify({"status": "error", "message": "User not logged in!"}), 400
     user_id = session['userID']
+    if SUGGESTION_SOURCE == 'first':
+        resp = _dictionary_response(user_id, level_matched=False)
+        if resp:
+            return resp
     ensure_suggestion_row(user_id)
 
+    # Remember the buffer version before looking, so a long-poll can't miss items appended meanwhile.
+    version = buffer_version(user_id, 'random')
     # Try to pop existing buffer (will skip/remove already-known words)
     item, used = pop_from_buffer(user_id, 'random')
     if used and item:
@@ -784,22 +2914,35 @@ def recommend_word():
         try:
             threading.Thread(target=generate_and_append_for_user, args=(user_id, 'random', None), daemon=True).start()
         except Exception as e:
-            deb_mes(f"Error starting background generation thread after pop: {e}")
+            deb_mes("Error starting background generation thread after pop: %s", e, level=logging.ERROR)
         return jsonify({"status": "success", "word": item['word'], "translation": item['translation']}), 200
 
     # Buffer empty
     if is_generating(user_id, 'random'):
+        wait = request.args.get('wait', 0, type=float)
+        item = wait_and_pop(user_id, 'random', version, wait) if wait > 0 else None
+        if item:
+            try:
+                threading.Thread(target=generate_and_append_for_user, args=(user_id, 'random', None), daemon=True).start()
+            except Exception as e:
+                deb_mes("Error starting background generation thread after wait: %s", e, level=logging.ERROR)
+            return jsonify({"status": "success", "word": item['word'], "translation": item['translation']}), 200
         return jsonify({"status": "busy", "message": "AI is generating suggestions — please wait."}), 202
 
+    if not take_generation_token(user_id, 'random'):
+        return _throttled_response(user_id, 'random')
+
     # Start synchronous generation
     mark_generation(user_id, 'random', True)
     try:
         new_items = ai_generate_random_pairs(user_id)
         if new_items is None:
-            return jsonify({"status": "error", "message": "AI is not available or returned invalid output."}), 503
+            return _dictionary_response(user_id, level_matched=False) or (
+                jsonify({"status": "error", "message": "AI is not available or returned invalid output."}), 503)
         # new_items may be fewer than 4 after filtering; if empty -> treat as no suggestions
         if not new_items:
-            return jsonify({"status": "error", "message": "AI returned only words already in your dictionary."}), 503
+            return _dictionary_response(user_id, level_matched=False) or (
+                jsonify({"status": "error", "message": "AI returned only words already in your dictionary."}), 503)
         write_buffer(user_id, 'random', new_items)
         item, _ = pop_from_buffer(user_id, 'random')
         if not item:
@@ -807,7 +2950,7 @@ def recommend_word():
         try:
             threading.Thread(target=generate_and_append_for_user, args=(user_id, 'random', None), daemon=True).start()
         except Exception as e:
-            deb_mes(f"Error starting background generation thread after sync fill: {e}")
+            deb_mes("Error starting background generation thread after sync fill: %s", e, level=logging.ERROR)
         return jsonify({"status": "success", "word": item['word'], "translation": item['translation']}), 200
     finally:
         mark_generation(user_id, 'random', False)
@@ -818,39 +2961,58 @@ def recommend_smart_word():
     Return a suggestion from the per-user smart buffer.
     If user has >40 words, only a random sample of 40 is included in the prompt.
     Duplicates in buffer/AI output are filtered out.
+    The offline dictionary serves level-matched words first or as fallback, like in recommend_word.
     """
     if 'userID' not in session:
         return jsonify({"status": "error", "message": "User not logged in!"}), 400
     user_id = session['userID']
+    if SUGGESTION_SOURCE == 'first':
+        resp = _dictionary_response(user_id, level_matched=True)
+        if resp:
+            return resp
     ensure_suggestion_row(user_id)
 
     # Collect user's current words for prompt
-    conn = get_db_connection()
+    conn = get_db_connection(user_id)
     cursor = conn.cursor()
     cursor.execute('SELECT word FROM words WHERE userID = ?', (user_id,))
     user_words = [r['word'] for r in cursor.fetchall()]
     conn.close()
 
+    version = buffer_version(user_id, 'smart')
     # Try to pop existing buffered suggestion (skips any that became duplicates)
     item, used = pop_from_buffer(user_id, 'smart')
     if used and item:
         try:
             threading.Thread(target=generate_and_append_for_user, args=(user_id, 'smart', user_words), daemon=True).start()
         except Exception as e:
-            deb_mes(f"Error starting background generation thread after pop (smart): {e}")
+            deb_mes("Error starting background generation thread after pop (smart): %s", e, level=logging.ERROR)
         return jsonify({"status": "success", "word": item['word'], "translation": item['translation']}), 200
 
     if is_generating(user_id, 'smart'):
+        wait = request.args.get('wait', 0, type=float)
+        item = wait_and_pop(user_id, 'smart', version, wait) if wait > 0 else None
+        if item:
+            try:
+                threading.Thread(target=generate_and_append_for_user, args=(user_id, 'smart', user_words), daemon=True).start()
+            except Exception as e:
+                deb_mes("Error starting background generation thread after wait (smart): %s", e, level=logging.ERROR)
+            return jsonify({"status": "success", "word": item['word'], "translation": item['translation']}), 200
         return jsonify({"status": "busy", "message": "AI is generating suggestions — please wait."}), 202
 
+    if not take_generation_token(user_id, 'smart'):
+        return _throttled_response(user_id, 'smart')
+
     # Start synchronous generation
     mark_generation(user_id, 'smart', True)
     try:
         new_items = ai_generate_smart_pairs(user_id, user_words)
         if new_items is None:
-            return jsonify({"status": "error", "message": "AI is not available or returned invalid output."}), 503
+            return _dictionary_response(user_id, level_matched=True) or (
+                jsonify({"status": "error", "message": "AI is not available or returned invalid output."}), 503)
         if not new_items:
-            return jsonify({"status": "error", "message": "AI returned only words already in your dictionary."}), 503
+            return _dictionary_response(user_id, level_matched=True) or (
+                jsonify({"status": "error", "message": "AI returned only words already in your dictionary."}), 503)
         write_buffer(user_id, 'smart', new_items)
         item, _ = pop_from_buffer(user_id, 'smart')
         if not item:
@@ -858,7 +3020,7 @@ def recommend_smart_word():
         try:
             threading.Thread(target=generate_and_append_for_user, args=(user_id, 'smart', user_words), daemon=True).start()
         except Exception as e:
-            deb_mes(f"Error starting background generation thread after sync fill (smart): {e}")
+            deb_mes("Error starting background generation thread after sync fill (smart): %s", e, level=logging.ERROR)
         return jsonify({"status": "success", "word": item['word'], "translation": item['translation']}), 200
     finally:
         mark_generation(user_id, 'smart', False)
@@ -872,17 +3034,60 @@ def routeToEdit():
 
 @app.route('/get_user_words', methods=['GET'])
 def get_user_words():
+    """All of the user's words, streamed (see json_list_response)."""
     if 'userID' not in session:
         return jsonify({"status": "error", "message": "User not logged in!"}), 400
     user_id = session['userID']
-    conn = get_db_connection()
+    return json_list_response(user_id, 'id, word, translation', ["id", "word", "translation"])
+
+def _fts_match_query(q):
+    """Turn free user input into a safe FTS5 MATCH expression: every term quoted and prefix-matched."""
+    terms = re.findall(r'\w+', q, flags=re.UNICODE)
+    return " ".join('"{}"*'.format(t) for t in terms)
+
+@app.route('/search_words', methods=['GET'])
+def search_words():
+    """
+    Paginated search over the user's words for the edit page.
+    Query args: q (prefix, accent-insensitive match on word or translation), page (1-based), per_page.
+    Without q it simply pages through the whole list in alphabetical order.
+    """
+    if 'userID' not in session:
+        return jsonify({"status": "error", "message": "User not logged in!"}), 400
+    user_id = session['userID']
+    q = request.args.get('q', '').strip()
+    try:
+        page = max(1, int(request.args.get('page', 1)))
+        per_page = min(SEARCH_MAX_PAGE_SIZE, max(1, int(request.args.get('per_page', SEARCH_PAGE_SIZE))))
+    except ValueError:
+        return jsonify({"status": "error", "message": "Invalid page!"}), 400
+    offset = (page - 1) * per_page
+
+    conn = get_db_connection(user_id)
     cursor = conn.cursor()
-    cursor.execute('SELECT id, word, translation FROM words WHERE userID = ? ORDER BY word', (user_id,))
+    match = _fts_match_query(q) if q else ''
+    if match and FTS_AVAILABLE:
+        where = 'FROM words_fts JOIN words ON words.id = words_fts.rowid WHERE words_fts MATCH ? AND words.userID = ?'
+        params = (match, user_id)
+    elif q:
+        like = q.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        where = "FROM words WHERE userID = ? AND (word LIKE ? ESCAPE '\\' OR translation LIKE ? ESCAPE '\\')"
+        params = (user_id, like, like)
+    else:
+        where = 'FROM words WHERE userID = ?'
+        params = (user_id,)
+    cursor.execute(f'SELECT COUNT(*) {where}', params)
+    total = cursor.fetchone()[0]
+    cursor.execute(f'SELECT words.id, words.word, words.translation {where} ORDER BY words.word LIMIT ? OFFSET ?',
+                   params + (per_page, offset))
     words = cursor.fetchall()
     conn.close()
     return jsonify({
         "status": "success",
-        "words": [{"id": w['id'], "word": w['word'], "translation": w['translation']} for w in words]
+        "words": [{"id": w['id'], "word": w['word'], "translation": w['translation']} for w in words],
+        "total": total,
+        "page": page,
+        "per_page": per_page
     })
 
 @app.route('/delete_word', methods=['POST'])
@@ -893,7 +3098,7 @@ def delete_word():
     word_id = request.json.get('word_id')
     if not word_id:
         return jsonify({"status": "error", "message": "Missing word_id!"}), 400
-    conn = get_db_connection()
+    conn = get_db_connection(user_id)
     cursor = conn.cursor()
     cursor.execute('DELETE FROM words WHERE id = ? AND userID = ?', (word_id, user_id))
     commit_and_update(conn)
@@ -909,7 +3114,7 @@ def update_word():
     new_translation = request.json.get('translation')
     if not all([word_id, new_word, new_translation]):
         return jsonify({"status": "error", "message": "Missing required fields!"}), 400
-    conn = get_db_connection()
+    conn = get_db_connection(user_id)
     cursor = conn.cursor()
     cursor.execute('''
         UPDATE words SET word = ?, translation = ? WHERE id = ? AND userID = ?
@@ -917,6 +3122,153 @@ def update_word():
     commit_and_update(conn)
     return jsonify({"status": "success", "message": "Word updated successfully!"})
 
+# =========================
+#  Bulk import / export
+# =========================
+
+# Column titles recognised on the first CSV line, which is then treated as a header rather than a word.
+CSV_HEADER_NAMES = {'word', 'words', 'translation', 'english', 'hungarian', 'angol', 'magyar', 'szó', 'fordítás'}
+
+def _iter_import_rows(stream, fmt):
+    """
+    Incrementally parse an uploaded word list into (word, translation) tuples.
+    fmt is 'csv' (word,translation per line, optionally under a header line) or 'jsonl' (one {"word","translation"}
+    object per line). Malformed lines come out as (None, None) so they are counted as skipped; blank lines are
+    ignored. The file is never read into memory at once.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', errors='replace', newline='')
+    if fmt == 'jsonl':
+        for line in text:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                obj = json.loads(line)
+            except ValueError:
+                obj = None
+            if isinstance(obj, dict):
+                yield obj.get('word'), obj.get('translation')
+            else:
+                yield None, None
+    else:
+        first = True
+        for cols in csv.reader(text):
+            if not any(c.strip() for c in cols):
+                continue
+            if first:
+                first = False
+                if len(cols) >= 2 and {cols[0].strip().lower(), cols[1].strip().lower()} <= CSV_HEADER_NAMES:
+                    continue
+            yield (cols[0], cols[1]) if len(cols) >= 2 else (None, None)
+
+IMPORT_INSERT_SQL = '''
+    INSERT INTO words (userID, word, translation, pass, passWithHelp, fail, failWithHelp)
+    VALUES (?, ?, ?, 0, 0, 0, 0)
+'''
+
+def import_words_for_user(user_id, rows):
+    """
+    Insert (word, translation) rows for a user with batched executemany() calls, each committed on its own
+    so no write transaction stays open while the next rows are still arriving from the client.
+    Rows whose normalized word is already in the user's vocabulary (or earlier in the same input) are skipped.
+    Generator: yields a progress dict after each batch; the last yielded dict is the final summary.
+    If the import fails midway, the batches committed so far are kept.
+    """
+    existing = _get_user_words_set_lower(user_id)
+    processed = inserted = skipped = 0
+    batch = []
+    conn = get_db_connection(user_id)
+
+    def write_batch():
+        conn.executemany(IMPORT_INSERT_SQL, batch)
+        conn.commit()
+        update_db_hmac(conn.db_path)
+
+    try:
+        for word, translation in rows:
+            processed += 1
+            word = (word or '').strip()
+            translation = (translation or '').strip()
+            key = word.lower()
+            if not word or not translation or key in existing:
+                skipped += 1
+                continue
+            existing.add(key)
+            batch.append((user_id, word, translation))
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                write_batch()
+                inserted += len(batch)
+                batch = []
+                yield {"status": "progress", "processed": processed, "inserted": inserted, "skipped": skipped}
+        if batch:
+            write_batch()
+            inserted += len(batch)
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    yield {"status": "success", "processed": processed, "inserted": inserted, "skipped": skipped}
+
+@app.route('/import_words', methods=['POST'])
+def import_words():
+    """
+    Bulk-import words from the raw request body (CSV or JSONL, chosen by ?format= or the Content-Type).
+    The body is parsed straight off the request stream, so large files are never spooled or buffered.
+    Streams newline-delimited JSON: one progress record per inserted batch, then a final summary.
+    """
+    if 'userID' not in session:
+        return jsonify({"status": "error", "message": "User not logged in!"}), 400
+    user_id = session['userID']
+    fmt = request.args.get('format')
+    if not fmt:
+        fmt = 'jsonl' if request.mimetype in ('application/x-ndjson', 'application/jsonl') else 'csv'
+    if fmt not in ('csv', 'jsonl'):
+        return jsonify({"status": "error", "message": "Unknown format!"}), 400
+    stream = request.stream
+
+    def generate():
+        saved = 0
+        try:
+            for event in import_words_for_user(user_id, _iter_import_rows(stream, fmt)):
+                saved = event['inserted']
+                yield json.dumps(event) + "\n"
+        except Exception as e:
+            deb_mes("import_words: import failed for user %s: %s", user_id, e, level=logging.ERROR)
+            yield json.dumps({"status": "error", "message": f"Import stopped; {saved} words were saved before the error.",
+                              "inserted": saved}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/export_words', methods=['GET'])
+def export_words():
+    """Stream the user's words as CSV (default) or JSONL without building the whole list in memory."""
+    if 'userID' not in session:
+        return jsonify({"status": "error", "message": "User not logged in!"}), 400
+    user_id = session['userID']
+    fmt = request.args.get('format', 'csv')
+    if fmt not in ('csv', 'jsonl'):
+        return jsonify({"status": "error", "message": "Unknown format!"}), 400
+
+    def generate():
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        # Chunked queries, not one open cursor: a slow download must not lock writers out of the shard.
+        for rows in iter_user_word_rows(user_id, 'id, word, translation'):
+            if fmt == 'jsonl':
+                for _, word, translation in rows:
+                    buf.write(json.dumps({"word": word, "translation": translation}, ensure_ascii=False))
+                    buf.write("\n")
+            else:
+                writer.writerows((word, translation) for _, word, translation in rows)
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate(0)
+
+    mimetype = 'application/x-ndjson' if fmt == 'jsonl' else 'text/csv'
+    return Response(stream_with_context(generate()), mimetype=mimetype,
+                    headers={"Content-Disposition": f"attachment; filename=words.{fmt}"})
+
 @app.route('/statistics')
 def routeToStatistics():
     if 'userID' not in session:
@@ -925,34 +3277,54 @@ def routeToStatistics():
 
 @app.route('/get_word_statistics', methods=['GET'])
 def get_word_statistics():
+    """Per-word practice counts plus the confidence index, streamed (see json_list_response)."""
     if 'userID' not in session:
         return jsonify({"status": "error", "message": "User not logged in!"}), 400
     user_id = session['userID']
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT id, word, translation, pass, passWithHelp, fail, failWithHelp 
-        FROM words WHERE userID = ? ORDER BY word
-    ''', (user_id,))
-    words = cursor.fetchall()
+    return json_list_response(user_id, '''
+        id, word, translation, pass, passWithHelp, fail, failWithHelp,
+        (pass * 2) + passWithHelp - fail - (failWithHelp * 2)
+    ''', ["id", "word", "translation", "pass", "passWithHelp", "fail", "failWithHelp", "confidenceIndex"])
+
+@app.route('/get_practice_timeseries', methods=['GET'])
+def get_practice_timeseries():
+    """
+    Attempts and accuracy per day or week, read from the rollups only (so they lag by up to ROLLUP_INTERVAL).
+    Query: period=day|week, count=number of buckets (newest last), word_id=optional single word.
+    """
+    if 'userID' not in session:
+        return jsonify({"status": "error", "message": "User not logged in!"}), 400
+    user_id = session['userID']
+    period = request.args.get('period', 'week')
+    if period not in ROLLUP_PERIODS:
+        return jsonify({"status": "error", "message": "Unknown period!"}), 400
+    try:
+        count = min(max(int(request.args.get('count', '12')), 1), 366)
+        word_id = int(request.args.get('word_id', '0'))
+    except ValueError:
+        return jsonify({"status": "error", "message": "Invalid count or word_id!"}), 400
+
+    step = 86400 if period == 'day' else 7 * 86400
+    newest = rollup_bucket(int(time.time()), period)
+    oldest = newest - (count - 1) * step
+    conn = get_db_connection(user_id)
+    rows = conn.execute('''
+        SELECT bucket, pass, passWithHelp, fail, failWithHelp FROM practice_rollups
+        WHERE userID = ? AND period = ? AND wordID = ? AND bucket >= ?
+    ''', (user_id, period, word_id, oldest)).fetchall()
     conn.close()
-    word_stats = []
-    for w in words:
-        confidence_index = (w['pass'] * 2) + w['passWithHelp'] - w['fail'] - (w['failWithHelp'] * 2)
-        word_stats.append({
-            "id": w['id'],
-            "word": w['word'],
-            "translation": w['translation'],
-            "pass": w['pass'],
-            "passWithHelp": w['passWithHelp'],
-            "fail": w['fail'],
-            "failWithHelp": w['failWithHelp'],
-            "confidenceIndex": confidence_index
-        })
-    return jsonify({
-        "status": "success",
-        "words": word_stats
-    })
+    by_bucket = {r['bucket']: r for r in rows}
+    series = []
+    for bucket in range(oldest, newest + 1, step):
+        r = by_bucket.get(bucket)
+        counts = {k: (r[k] if r else 0) for k in ('pass', 'passWithHelp', 'fail', 'failWithHelp')}
+        attempts = sum(counts.values())
+        passed = counts['pass'] + counts['passWithHelp']
+        series.append(dict(counts,
+                           start=time.strftime('%Y-%m-%d', time.gmtime(bucket)),
+                           attempts=attempts,
+                           accuracy=round(passed / attempts, 4) if attempts else None))
+    return jsonify({"status": "success", "period": period, "word_id": word_id, "series": series})
 
 @app.route('/settings')
 def routeToSettings():
@@ -999,7 +3371,11 @@ def update_user():
         params.append(new_username)
     if new_password:
         updates.append('password = ?')
-        params.append(generate_password_hash(new_password))
+        try:
+            params.append(hash_password(new_password))
+        except HashingOverloaded:
+            conn.close()
+            return jsonify({"status": "error", "message": "Server is busy, please try again."}), 429, {"Retry-After": "1"}
     if updates:
         params.append(user_id)
         query = f'UPDATE users SET {", ".join(updates)} WHERE id = ?'
@@ -1030,27 +3406,525 @@ def set_theme():
         return jsonify({"status": "success", "message": "Theme set", "theme": theme}), 200
     return jsonify({"status": "success", "message": "Theme set", "theme": theme}), 200
 
+# =========================
+#  Async (ASGI) serving
+# =========================
+# With --asgi the suggestion and accept endpoints run as coroutines: a request waiting on the model
+# or on a long-poll costs a coroutine instead of a thread, and refills are asyncio tasks using the
+# async Ollama client. Every other request runs the Flask app on a bounded pool of worker threads.
+# SQLite calls stay synchronous but are short; they run on ASYNC_DB_WORKERS executor threads.
+
+_async_db_executor = ThreadPoolExecutor(max_workers=ASYNC_DB_WORKERS, thread_name_prefix='asyncdb')
+_async_ollama_clients = {}  # event loop -> ollama.AsyncClient (its HTTP pool belongs to that loop)
+_refill_tasks = set()  # strong references, so running refills aren't garbage collected
+
+async def run_db(fn, *args):
+    """Run a (short) blocking database helper on the async DB executor."""
+    return await asyncio.get_running_loop().run_in_executor(_async_db_executor, functools.partial(fn, *args))
+
+def _wake_async_waiter(fut):
+    if not fut.done():
+        fut.set_result(True)
+
+async def await_buffer(user_id, kind, since, timeout):
+    """Coroutine version of wait_for_buffer(); notify_buffer() wakes it from any thread."""
+    loop = asyncio.get_running_loop()
+    fut = loop.create_future()
+    key = (user_id, kind)
+    with buffer_cond:
+        if buffer_versions.get(key, 0) != since:
+            return True
+        async_buffer_waiters.setdefault(key, set()).add((loop, fut))
+    try:
+        await asyncio.wait_for(fut, timeout)
+        return True
+    except asyncio.TimeoutError:
+        return False
+    finally:
+        with buffer_cond:
+            waiters = async_buffer_waiters.get(key)
+            if waiters:
+                waiters.discard((loop, fut))
+                if not waiters:
+                    del async_buffer_waiters[key]
+
+async def await_and_pop(user_id, kind, since, wait):
+    """Coroutine version of wait_and_pop()."""
+    deadline = time.monotonic() + min(wait, LONGPOLL_MAX_WAIT)
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or not await await_buffer(user_id, kind, since, remaining):
+            return None
+        since = buffer_version(user_id, kind)
+        item, used = await run_db(pop_from_buffer, user_id, kind)
+        if item:
+            return item
+        if not is_generating(user_id, kind):
+            return None
+
+async def aollama_generate(prompt):
+    """ollama_generate() with the async client: retries with backoff until OLLAMA_TIMEOUT, without a thread."""
+    start = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    client = _async_ollama_clients.get(loop)
+    if client is None:
+        client = _async_ollama_clients[loop] = ollama_client().AsyncClient()
+    result = None
+    delay = 1.0
+    while result is None:
+        remaining = OLLAMA_TIMEOUT - (time.perf_counter() - start)
+        if remaining <= 0:
+            break
+        try:
+            res = await asyncio.wait_for(client.generate(model=OLLAMA_MODEL, prompt=prompt), remaining)
+            result = _extract_response_from_obj(res)
+        except asyncio.TimeoutError:
+            break
+        except Exception as e:
+            deb_mes("aollama_generate: generate exception: %s", e, level=logging.WARNING)
+        if result is None:
+            await asyncio.sleep(min(delay, max(0.0, OLLAMA_TIMEOUT - (time.perf_counter() - start))))
+            delay = min(delay * 2, 8.0)
+    metric_observe('ollama_generate_seconds', time.perf_counter() - start,
+                   outcome='ok' if result is not None else 'failed')
+    return result
+
+async def agenerate_new_pairs(user_id, kind, user_words=None):
+    """generate_new_pairs() driven by aollama_generate(); the filtering steps run on the DB executor."""
+    plan = plan_new_pairs(user_id, kind, pairs_prompt_builder(kind, user_words))
+    done, value = await run_db(advance_plan, plan, None)
+    while not done:
+        done, value = await run_db(advance_plan, plan, await aollama_generate(value))
+    return value
+
+async def agenerate_and_append_for_user(user_id, kind, user_words=None):
+    """Coroutine version of generate_and_append_for_user()."""
+    if is_generating(user_id, kind):
+        deb_mes("Generation already in progress for user %s kind %s", user_id, kind)
+        return
+    if not take_generation_token(user_id, kind):
+        return  # over quota: the buffer refills on a later request
+    metric_inc('generation_started_total', kind=kind)
+    try:
+        mark_generation(user_id, kind, True)
+        new_items = await agenerate_new_pairs(user_id, kind, user_words)
+        if new_items is None:
+            deb_mes("agenerate_and_append_for_user: AI generation failed for user %s kind %s", user_id, kind, level=logging.WARNING)
+        elif not new_items:
+            deb_mes("agenerate_and_append_for_user: no new unique items generated for user %s kind %s", user_id, kind)
+        else:
+            await run_db(append_to_buffer, user_id, kind, new_items)
+    except Exception as e:
+        deb_mes("Error generating/appending suggestions for user %s kind %s: %s", user_id, kind, e, level=logging.ERROR)
+    finally:
+        mark_generation(user_id, kind, False)
+        notify_buffer(user_id, kind)
+        metric_inc('generation_finished_total', kind=kind)
+
+def spawn_refill(user_id, kind, user_words=None):
+    task = asyncio.ensure_future(agenerate_and_append_for_user(user_id, kind, user_words))
+    _refill_tasks.add(task)
+    task.add_done_callback(_refill_tasks.discard)
+
+def _user_word_list(user_id):
+    conn = get_db_connection(user_id)
+    words = [r['word'] for r in conn.execute('SELECT word FROM words WHERE userID = ?', (user_id,))]
+    conn.close()
+    return words
+
+def _insert_word(user_id, word, translation):
+    conn = get_db_connection(user_id)
+    conn.execute('''
+        INSERT INTO words (userID, word, translation, pass, passWithHelp, fail, failWithHelp)
+        VALUES (?, ?, ?, 0, 0, 0, 0)
+    ''', (user_id, word, translation))
+    commit_and_update(conn)
+
+def _suggestion_payload(item, source=None):
+    payload = {"status": "success", "word": item['word'], "translation": item['translation']}
+    if source:
+        payload["source"] = source
+    return payload
+
+async def arecommend(user_id, kind, wait):
+    """
+    recommend_word / recommend_smart_word as a coroutine; same responses as the Flask routes.
+    Returns (status, payload) or (status, payload, extra headers).
+    """
+    level_matched = kind == 'smart'
+    if SUGGESTION_SOURCE == 'first':
+        item = await run_db(dictionary_suggestion, user_id, level_matched)
+        if item:
+            return 200, _suggestion_payload(item, 'dictionary')
+    await run_db(ensure_suggestion_row, user_id)
+    user_words = await run_db(_user_word_list, user_id) if kind == 'smart' else None
+
+    version = buffer_version(user_id, kind)
+    item, used = await run_db(pop_from_buffer, user_id, kind)
+    if used and item:
+        spawn_refill(user_id, kind, user_words)
+        return 200, _suggestion_payload(item)
+
+    if is_generating(user_id, kind):
+        item = await await_and_pop(user_id, kind, version, wait) if wait > 0 else None
+        if item:
+            spawn_refill(user_id, kind, user_words)
+            return 200, _suggestion_payload(item)
+        return 202, {"status": "busy", "message": "AI is generating suggestions — please wait."}
+
+    if not take_generation_token(user_id, kind):
+        status, payload, retry = await run_db(throttled_suggestion, user_id, kind)
+        return (status, payload, {"Retry-After": str(retry)}) if retry else (status, payload)
+
+    mark_generation(user_id, kind, True)
+    try:
+        new_items = await agenerate_new_pairs(user_id, kind, user_words)
+        if not new_items:
+            item = None
+            if SUGGESTION_SOURCE != 'off':
+                item = await run_db(dictionary_suggestion, user_id, level_matched)
+            if item:
+                return 200, _suggestion_payload(item, 'dictionary')
+            message = ("AI is not available or returned invalid output." if new_items is None
+                       else "AI returned only words already in your dictionary.")
+            return 503, {"status": "error", "message": message}
+        await run_db(write_buffer, user_id, kind, new_items)
+        item, _ = await run_db(pop_from_buffer, user_id, kind)
+        if not item:
+            return 500, {"status": "error", "message": "Failed to prepare suggestions."}
+    finally:
+        mark_generation(user_id, kind, False)
+    spawn_refill(user_id, kind, user_words)
+    return 200, _suggestion_payload(item)
+
+def _query_wait(query):
+    try:
+        return float(query.get('wait', ['0'])[0])
+    except ValueError:
+        return 0.0
+
+async def arecommend_word(user_id, query, body):
+    return await arecommend(user_id, 'random', _query_wait(query))
+
+async def arecommend_smart_word(user_id, query, body):
+    return await arecommend(user_id, 'smart', _query_wait(query))
+
+async def aaccept_word(user_id, query, body):
+    """accept_word as a coroutine; refills both buffers as asyncio tasks."""
+    try:
+        data = json.loads(body or b'{}')
+    except ValueError:
+        data = {}
+    word, translation = data.get('word'), data.get('translation')
+    if not word or not translation:
+        return 400, {"status": "error", "message": "Missing word or translation!"}
+    if word.strip().lower() in await run_db(_get_user_words_set_lower, user_id):
+        return 400, {"status": "error", "message": "Word already exists in your dictionary."}
+    await run_db(_insert_word, user_id, word, translation)
+    spawn_refill(user_id, 'random')
+    spawn_refill(user_id, 'smart', await run_db(_user_word_list, user_id))
+    return 200, {"status": "success", "message": "Word accepted and added!"}
+
+ASYNC_ROUTES = {
+    ('GET', '/recommend_word'): arecommend_word,
+    ('GET', '/recommend_smart_word'): arecommend_smart_word,
+    ('POST', '/accept_word'): aaccept_word,
+}
+
+class _ReceiveStream(io.RawIOBase):
+    """
+    wsgi.input for the WSGI bridge: reads pull the request body from ASGI receive() on demand, so uploads
+    reach the Flask app as they arrive instead of being collected in memory first. Used from a worker thread.
+    """
+
+    def __init__(self, receive, loop):
+        self.receive, self.loop = receive, loop
+        self.pending = b''
+        self.more = True
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self.pending and self.more:
+            message = asyncio.run_coroutine_threadsafe(self.receive(), self.loop).result()
+            if message['type'] == 'http.disconnect':
+                raise OSError("client disconnected during the request body")
+            self.pending = message.get('body', b'')
+            self.more = message.get('more_body', False)
+        n = min(len(b), len(self.pending))
+        b[:n] = self.pending[:n]
+        self.pending = self.pending[n:]
+        return n
+
+class SuggestionASGI:
+    """
+    ASGI application: ASYNC_ROUTES are served as coroutines, every other request runs the Flask app on
+    ASGI_WSGI_WORKERS executor threads (responses, including streamed ones, are relayed chunk by chunk).
+    """
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.wsgi_executor = ThreadPoolExecutor(max_workers=ASGI_WSGI_WORKERS, thread_name_prefix='wsgi')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] != 'http':
+            return
+        handler = ASYNC_ROUTES.get((scope['method'], scope['path']))
+        if handler is None:
+            return await self.call_wsgi(scope, receive, send)
+        body = await self.read_body(receive)
+        if body is None:
+            return await self.send_json(send, 413, {"status": "error", "message": "Request body too large!"})
+        await self.handle(handler, scope, body, send)
+
+    async def read_body(self, receive):
+        """The whole request body for an async route, or None once it exceeds ASGI_MAX_BODY."""
+        body = b''
+        more = True
+        while more:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                break
+            body += message.get('body', b'')
+            if len(body) > ASGI_MAX_BODY:
+                return None
+            more = message.get('more_body', False)
+        return body
+
+    def wsgi_environ(self, scope, body_stream):
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': str(server[0]),
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': 'HTTP/' + scope.get('http_version', '1.1'),
+            'REMOTE_ADDR': client[0],
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': body_stream,
+            'wsgi.input_terminated': True,  # read to EOF even without a Content-Length (chunked uploads)
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        for name, value in scope['headers']:
+            name = name.decode('latin-1').upper().replace('-', '_')
+            key = name if name in ('CONTENT_TYPE', 'CONTENT_LENGTH') else 'HTTP_' + name
+            value = value.decode('latin-1')
+            environ[key] = environ[key] + ',' + value if key in environ else value
+        return environ
+
+    async def call_wsgi(self, scope, receive, send):
+        """Run the Flask app for one request on a worker thread; chunks come back through a small queue."""
+        loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue(maxsize=16)  # bounded, so a streamed export can't outrun a slow client
+        head = {}
+
+        def push(item):
+            asyncio.run_coroutine_threadsafe(chunks.put(item), loop).result()
+
+        def run():
+            def start_response(status, headers, exc_info=None):
+                head['status'], head['headers'] = int(status.split(' ', 1)[0]), headers
+                return push
+            try:
+                result = self.flask_app(environ, start_response)
+                try:
+                    for chunk in result:
+                        if chunk:
+                            push(chunk)
+                finally:
+                    if hasattr(result, 'close'):
+                        result.close()
+            finally:
+                push(None)
+
+        environ = self.wsgi_environ(scope, io.BufferedReader(_ReceiveStream(receive, loop)))
+        job = loop.run_in_executor(self.wsgi_executor, run)
+        started = finished = False
+        try:
+            while True:
+                chunk = await chunks.get()
+                if not started:
+                    await send({'type': 'http.response.start', 'status': head.get('status', 500),
+                                'headers': [(k.encode('latin-1'), v.encode('latin-1')) for k, v in head.get('headers', [])]})
+                    started = True
+                if chunk is None:
+                    finished = True
+                    break
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            if not finished:
+                # Client went away mid-response: keep draining so the worker thread can finish.
+                async def drain():
+                    while await chunks.get() is not None:
+                        pass
+                asyncio.ensure_future(drain())
+        await job
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def session_user(self, headers):
+        """userID from Flask's signed session cookie, or None."""
+        cookies = parse_cookie(headers.get(b'cookie', b'').decode('latin-1'))
+        raw = cookies.get(self.flask_app.config['SESSION_COOKIE_NAME'])
+        serializer = self.flask_app.session_interface.get_signing_serializer(self.flask_app)
+        if not raw or serializer is None:
+            return None
+        try:
+            data = serializer.loads(raw, max_age=int(self.flask_app.permanent_session_lifetime.total_seconds()))
+        except BadData:  # bad signature, expired, or undecodable payload
+            return None
+        return data.get('userID') if isinstance(data, dict) else None
+
+    async def handle(self, handler, scope, body, send):
+        started = time.perf_counter()
+        headers = dict(scope['headers'])
+        request_id = headers.get(b'x-request-id', b'').decode('latin-1') or uuid.uuid4().hex[:16]
+        user_id = self.session_user(headers)
+        extra = {}
+        if user_id is None:
+            status, payload = 400, {"status": "error", "message": "User not logged in!"}
+        else:
+            try:
+                status, payload, *rest = await handler(user_id, parse_qs(scope.get('query_string', b'').decode()), body)
+                extra = rest[0] if rest else {}
+            except Exception as e:
+                deb_mes("%s failed: %s", handler.__name__, e, level=logging.ERROR)
+                status, payload = 500, {"status": "error", "message": "Internal error."}
+        extra['X-Request-ID'] = request_id
+        await self.send_json(send, status, payload, extra)
+        if METRICS_ENABLED:
+            endpoint = handler.__name__[1:]  # same label as the Flask route
+            metric_observe('http_request_duration_seconds', time.perf_counter() - started, endpoint=endpoint)
+            metric_inc('http_requests_total', endpoint=endpoint, method=scope['method'], status=status)
+
+    async def send_json(self, send, status, payload, headers=None):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        await send({'type': 'http.response.start', 'status': status, 'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(data)).encode()),
+        ] + [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in (headers or {}).items()]})
+        await send({'type': 'http.response.body', 'body': data})
+
+def create_asgi_app():
+    """ASGI entry point (e.g. `uvicorn --factory app:create_asgi_app`); starts the background services too."""
+    start_background_services()
+    return SuggestionASGI(app)
+
 #==========================
 #           Run
 #==========================
+_services_lock = threading.Lock()
+_services_started = False
+
+def start_background_services(precache=False):
+    """
+    Verify and initialise the database, load assets and the dictionary, and start the event flush, backup and
+    maintenance threads. Runs once per process however it was started (__main__ or the ASGI factory).
+    """
+    global _services_started
+    with _services_lock:
+        if _services_started:
+            return
+        _services_started = True
+
+        startup_phase('module_load')
+        verify_db_hmac()
+        startup_phase('verify_hmac')
+        init_db()
+        startup_phase('init_db')
+        asset_manifest()
+        startup_phase('assets')
+        if SUGGESTION_SOURCE != 'off':
+            load_dictionary()
+            startup_phase('dictionary')
+
+        # Start background precache for all users only when asked (--precache)
+        if precache:
+            try:
+                t = threading.Thread(target=precache_suggestions_for_all_users, daemon=True)
+                t.start()
+                deb_mes("Started background precache thread", level=logging.INFO)
+            except Exception as e:
+                deb_mes("Failed to start precache thread: %s", e, level=logging.ERROR)
+        else:
+            deb_mes("Precache skipped (run with --precache to enable)", level=logging.INFO)
+
+        threading.Thread(target=practice_event_worker, daemon=True).start()
+
+        if BACKUP_INTERVAL > 0:
+            threading.Thread(target=backup_scheduler, daemon=True).start()
+            deb_mes("Started backup scheduler (every %ds into %s)", BACKUP_INTERVAL, BACKUP_DIR, level=logging.INFO)
+
+        if MAINTENANCE_INTERVAL > 0:
+            threading.Thread(target=maintenance_scheduler, daemon=True).start()
+
+        startup_phase('background_threads')
+        report_startup()
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="Run the Flask app.")
     parser.add_argument('--precache', action='store_true', help='Start background precache of AI suggestions on startup')
+    parser.add_argument('--migrate-shards', type=int, metavar='N', help='Redistribute user data over N shard files (1 = single file) and exit')
+    parser.add_argument('--backup-now', action='store_true', help='Take one online backup snapshot and exit')
+    parser.add_argument('--maintenance', nargs='?', const='quick', choices=['quick', 'full'],
+                        help='Run database maintenance once and exit; "full" also rebuilds the files with VACUUM')
+    parser.add_argument('--build-assets', action='store_true', help='Build the fingerprinted static bundles and exit')
+    parser.add_argument('--asgi', action='store_true', help='Serve through uvicorn with the async suggestion endpoints (needs uvicorn)')
     args = parser.parse_args()
 
-    verify_db_hmac()
-    init_db()
-
-    # Start background precache for all users only when --precache is provided
-    if args.precache:
+    if args.build_assets:
+        print(f"Built {len(build_assets())} bundles into {ASSET_BUILD_DIR}")
+        sys.exit(0)
+
+    if args.backup_now:
+        verify_db_hmac()
+        print(f"Backup written to {run_backup()}")
+        sys.exit(0)
+
+    if args.maintenance:
+        verify_db_hmac()
+        init_db()
+        for report in run_maintenance(full=(args.maintenance == 'full')):
+            before, after = report['before'], report['after']
+            print(f"{report['path']}: {before['bytes'] / 1e6:.2f} MB -> {after['bytes'] / 1e6:.2f} MB, "
+                  f"free pages {before['free_pages']} ({before['fragmentation']:.1%}) -> {after['free_pages']} "
+                  f"({after['fragmentation']:.1%}), buffers dropped {report['buffers_dropped']}, "
+                  f"trimmed {report['buffers_trimmed']}, {report['seconds']}s")
+        sys.exit(0)
+
+    if args.migrate_shards is not None:
+        verify_db_hmac()
+        migrate_shards(max(1, args.migrate_shards))
+        print(f"Storage migrated to {max(1, args.migrate_shards)} shard(s). Start the app with STORAGE_SHARDS={max(1, args.migrate_shards)}.")
+        sys.exit(0)
+
+    start_background_services(precache=args.precache)
+
+    if args.asgi:
         try:
-            t = threading.Thread(target=precache_suggestions_for_all_users, daemon=True)
-            t.start()
-            deb_mes("Started background precache thread")
-        except Exception as e:
-            deb_mes(f"Failed to start precache thread: {e}")
-    else:
-        deb_mes("Precache skipped (run with --precache to enable)")
+            import uvicorn  # optional dependency, only needed for the ASGI mode
+        except ImportError:
+            sys.exit("--asgi needs uvicorn installed; try: python run_app.py --asgi")
+        uvicorn.run(create_asgi_app(), host='0.0.0.0', port=5000, log_level='warning')
+        sys.exit(0)
 
     debug_mode = os.environ.get("FLASK_DEBUG", "0") == "1"
     app.run(host='0.0.0.0', debug=debug_mode)
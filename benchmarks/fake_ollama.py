@@ -0,0 +1,222 @@
+"""
+fake_ollama.py — deterministic local stand-in for the Ollama HTTP API, for load tests without a model.
+
+Serves POST /api/generate (streaming and non-streaming) plus the small endpoints the ollama client probes.
+Point the app at it with OLLAMA_HOST=http://127.0.0.1:11435.
+
+Usage:
+  - python benchmarks/fake_ollama.py                                   # listen on 127.0.0.1:11435
+  - python benchmarks/fake_ollama.py --latency 2.0 --jitter 0.5        # seconds per generation
+  - python benchmarks/fake_ollama.py --failure-rate 0.1                # 10% HTTP 500 responses
+  - python benchmarks/fake_ollama.py --shapes normal=6,numbered=2,chatty=1,short=1,empty=1,alt_key=1
+  - python benchmarks/fake_ollama.py --chunk-delay 0.05                # per-chunk delay when the client streams
+
+Response shapes (picked per request by weight, deterministic for a given --seed):
+  normal    N lines of "word:translation" (N from "Give me N ..." in the prompt, default 4)
+  numbered  "1. word: translation" lines
+  chatty    pairs wrapped in an intro and closing sentence
+  short     one pair fewer than asked for
+  malformed pairs separated by " - " instead of ":"
+  empty     an empty response string (drives the client's retry loop)
+  alt_key   text under "text" instead of "response"
+
+GET /_stats returns call counters as JSON; POST /_reset clears them.
+"""
+
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+WORD_PAIRS = [
+    ("apple", "alma"), ("house", "ház"), ("river", "folyó"), ("mountain", "hegy"), ("bread", "kenyér"),
+    ("window", "ablak"), ("chair", "szék"), ("table", "asztal"), ("dog", "kutya"), ("cat", "macska"),
+    ("bird", "madár"), ("tree", "fa"), ("flower", "virág"), ("water", "víz"), ("fire", "tűz"),
+    ("book", "könyv"), ("pencil", "ceruza"), ("school", "iskola"), ("teacher", "tanár"), ("friend", "barát"),
+    ("money", "pénz"), ("street", "utca"), ("city", "város"), ("village", "falu"), ("garden", "kert"),
+    ("kitchen", "konyha"), ("mirror", "tükör"), ("cloud", "felhő"), ("rain", "eső"), ("snow", "hó"),
+    ("summer", "nyár"), ("winter", "tél"), ("market", "piac"), ("bridge", "híd"), ("island", "sziget"),
+    ("forest", "erdő"), ("lake", "tó"), ("key", "kulcs"), ("door", "ajtó"), ("clock", "óra"),
+    ("lantern", "lámpás"), ("harbor", "kikötő"), ("whisper", "suttogás"), ("meadow", "rét"), ("castle", "vár"),
+    ("honey", "méz"), ("cheese", "sajt"), ("wheel", "kerék"), ("shadow", "árnyék"), ("thunder", "mennydörgés"),
+]
+
+DEFAULT_SHAPES = "normal=8,numbered=2,chatty=1,short=1,empty=1,alt_key=1"
+
+class FakeOllamaState:
+    def __init__(self, args):
+        self.args = args
+        self.lock = threading.Lock()
+        self.counter = 0
+        self.stats = {"calls": 0, "failures": 0, "streamed": 0, "by_shape": {}}
+        self.shapes = []
+        for part in args.shapes.split(","):
+            name, _, weight = part.partition("=")
+            self.shapes.append((name.strip(), float(weight or 1)))
+
+    def next_request(self):
+        """Return a per-request RNG; request n always sees the same random sequence for a given seed."""
+        with self.lock:
+            self.counter += 1
+            n = self.counter
+            self.stats["calls"] += 1
+        return random.Random(self.args.seed * 1_000_003 + n), n
+
+    def record(self, key, shape=None):
+        with self.lock:
+            if key:
+                self.stats[key] += 1
+            if shape:
+                self.stats["by_shape"][shape] = self.stats["by_shape"].get(shape, 0) + 1
+
+    def snapshot(self):
+        with self.lock:
+            return json.loads(json.dumps(self.stats))
+
+    def reset(self):
+        with self.lock:
+            self.stats = {"calls": 0, "failures": 0, "streamed": 0, "by_shape": {}}
+
+def pick_shape(rng, shapes):
+    total = sum(w for _, w in shapes)
+    x = rng.uniform(0, total)
+    for name, weight in shapes:
+        x -= weight
+        if x <= 0:
+            return name
+    return shapes[-1][0]
+
+def render_pairs(rng, n, shape, serial):
+    """Build the model text for a shape. Words past the built-in list get a serial suffix so they stay unseen."""
+    pairs = []
+    for i in range(n):
+        en, hu = rng.choice(WORD_PAIRS)
+        if rng.random() < 0.5:
+            en, hu = f"{en}{serial}x{i}", f"{hu}{serial}x{i}"
+        pairs.append((en, hu))
+    if shape == "numbered":
+        return "\n".join(f"{i + 1}. {en}: {hu}" for i, (en, hu) in enumerate(pairs))
+    if shape == "chatty":
+        body = "\n".join(f"{en}:{hu}" for en, hu in pairs)
+        return f"Sure! Here are some words for you:\n\n{body}\n\nGood luck with your studies!"
+    if shape == "malformed":
+        return "\n".join(f"{en} - {hu}" for en, hu in pairs)
+    return "\n".join(f"{en}:{hu}" for en, hu in pairs)
+
+def make_handler(state):
+    args = state.args
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, fmt, *a):
+            if args.verbose:
+                super().log_message(fmt, *a)
+
+        def _send_json(self, code, obj):
+            body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/_stats":
+                return self._send_json(200, state.snapshot())
+            if self.path == "/api/version":
+                return self._send_json(200, {"version": "0.0.0-fake"})
+            if self.path == "/api/tags":
+                return self._send_json(200, {"models": [{"name": args.model, "model": args.model}]})
+            if self.path == "/":
+                return self._send_json(200, {"status": "Ollama is running"})
+            self._send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length) if length else b"{}"
+            if self.path == "/_reset":
+                state.reset()
+                return self._send_json(200, {"status": "ok"})
+            if self.path != "/api/generate":
+                return self._send_json(404, {"error": "not found"})
+            try:
+                req = json.loads(raw or b"{}")
+            except ValueError:
+                return self._send_json(400, {"error": "invalid json"})
+
+            rng, serial = state.next_request()
+            time.sleep(max(0.0, rng.gauss(args.latency, args.jitter)))
+            if rng.random() < args.failure_rate:
+                state.record("failures")
+                return self._send_json(500, {"error": "fake failure"})
+
+            shape = pick_shape(rng, state.shapes)
+            state.record(None, shape)
+            match = re.search(r"Give me (\d+)", req.get("prompt", ""))
+            n = min(int(match.group(1)), 50) if match else 4
+            n = n - 1 if shape == "short" else n
+            text = "" if shape == "empty" else render_pairs(rng, n, shape, serial)
+            model = req.get("model", args.model)
+
+            if req.get("stream", True) is False:
+                key = "text" if shape == "alt_key" else "response"
+                obj = {"model": model, "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ"), "done": True, key: text}
+                if key != "response":
+                    obj["response"] = ""
+                return self._send_json(200, obj)
+
+            # Streaming: NDJSON chunks of a few characters each, then a final done record.
+            state.record("streamed")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            def write_chunk(obj):
+                data = (json.dumps(obj, ensure_ascii=False) + "\n").encode("utf-8")
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            step = max(1, args.chunk_chars)
+            for i in range(0, len(text), step):
+                write_chunk({"model": model, "response": text[i:i + step], "done": False})
+                if args.chunk_delay:
+                    time.sleep(args.chunk_delay)
+            write_chunk({"model": model, "response": "", "done": True, "done_reason": "stop"})
+            self.wfile.write(b"0\r\n\r\n")
+
+    return Handler
+
+def main():
+    parser = argparse.ArgumentParser(description="Deterministic fake Ollama server for load testing.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--model", default="gemma3:4b")
+    parser.add_argument("--latency", type=float, default=1.0, help="Mean generation latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Std deviation of the latency in seconds")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 500")
+    parser.add_argument("--shapes", default=DEFAULT_SHAPES, help="Comma separated shape=weight list")
+    parser.add_argument("--chunk-chars", type=int, default=4, help="Characters per streamed chunk")
+    parser.add_argument("--chunk-delay", type=float, default=0.0, help="Delay between streamed chunks in seconds")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    args = parser.parse_args()
+
+    state = FakeOllamaState(args)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(state))
+    server.daemon_threads = True
+    print(f"Fake Ollama listening on http://{args.host}:{args.port} (latency {args.latency}s, "
+          f"failure rate {args.failure_rate:.0%}, shapes {args.shapes})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
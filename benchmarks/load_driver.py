@@ -0,0 +1,214 @@
+"""
+load_driver.py — scripted end-to-end load generator simulating user sessions against a running app.
+
+Each virtual user registers, logs in, seeds a few words, then loops over weighted actions until the
+duration ends: practice (random word + score update), cards (word count + a hand of random words)
+and suggestions (recommend_word / recommend_smart_word with retries on 202 busy, then accept or dismiss).
+
+Usage (with the fake model server):
+  - python benchmarks/fake_ollama.py --latency 1.5 &
+  - OLLAMA_HOST=http://127.0.0.1:11435 python app.py &
+  - python benchmarks/load_driver.py --users 20 --duration 60 --ollama-url http://127.0.0.1:11435
+
+Reports throughput, p50/p95/p99 latency per endpoint, the 202 busy rate of the suggestion endpoints
+and (when --ollama-url points at fake_ollama.py) the number of model calls per accepted word.
+"""
+
+import json
+import time
+import random
+import argparse
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+import http.cookiejar
+
+ACTIONS = (("practice", 0.5), ("cards", 0.2), ("suggest", 0.3))
+SEED_WORDS = [("apple", "alma"), ("house", "ház"), ("dog", "kutya"), ("cat", "macska"), ("book", "könyv"),
+              ("water", "víz"), ("tree", "fa"), ("city", "város"), ("friend", "barát"), ("door", "ajtó")]
+SCORE_STATUSES = ("pass", "passWithHelp", "fail", "failWithHelp")
+
+class Recorder:
+    """Thread-safe collection of per-endpoint latencies and outcome counters."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.statuses = {}
+        self.accepted = 0
+        self.errors = 0
+
+    def add(self, endpoint, seconds, status):
+        with self.lock:
+            self.latencies.setdefault(endpoint, []).append(seconds)
+            key = (endpoint, status)
+            self.statuses[key] = self.statuses.get(key, 0) + 1
+
+    def count(self, attr):
+        with self.lock:
+            setattr(self, attr, getattr(self, attr) + 1)
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, int(round(p / 100.0 * (len(sorted_values) - 1)))))
+    return sorted_values[k]
+
+class VirtualUser:
+    def __init__(self, idx, args, recorder, rng):
+        self.idx = idx
+        self.args = args
+        self.rec = recorder
+        self.rng = rng
+        self.base = args.base_url.rstrip("/")
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+        self.username = f"load-{args.run_id}-{idx}"
+
+    def request(self, endpoint, method="GET", form=None, payload=None):
+        """Perform one request; returns (status, parsed JSON or None). Latency is recorded per endpoint."""
+        url = self.base + endpoint
+        data = None
+        headers = {}
+        if form is not None:
+            data = urllib.parse.urlencode(form).encode()
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        elif payload is not None:
+            data = json.dumps(payload).encode()
+            headers["Content-Type"] = "application/json"
+        req = urllib.request.Request(url, data=data, method=method, headers=headers)
+        start = time.perf_counter()
+        try:
+            with self.opener.open(req, timeout=self.args.timeout) as resp:
+                body = resp.read()
+                status = resp.status
+        except urllib.error.HTTPError as e:
+            body = e.read()
+            status = e.code
+        except Exception:
+            self.rec.add(endpoint.split("?")[0], time.perf_counter() - start, "error")
+            self.rec.count("errors")
+            return None, None
+        self.rec.add(endpoint.split("?")[0], time.perf_counter() - start, status)
+        try:
+            return status, json.loads(body)
+        except ValueError:
+            return status, None
+
+    def login(self):
+        self.request("/register", "POST", form={"username": self.username, "password": "load"})
+        self.request("/login", "POST", form={"username": self.username, "password": "load"})
+        for word, translation in SEED_WORDS:
+            self.request("/add_word", "POST", form={"word": word, "translation": translation})
+
+    def practice(self):
+        for _ in range(self.rng.randint(3, 8)):
+            status, data = self.request("/get_random_word")
+            if status == 200 and data and data.get("word_id"):
+                self.think()
+                self.request("/update_score", "POST",
+                             payload={"word_id": data["word_id"], "status": self.rng.choice(SCORE_STATUSES)})
+
+    def cards(self):
+        self.request("/get_word_count")
+        for _ in range(4):
+            self.request("/get_random_word")
+
+    def suggest(self):
+        endpoint = "/recommend_smart_word" if self.rng.random() < 0.5 else "/recommend_word"
+        if self.args.wait:
+            endpoint += f"?wait={self.args.wait}"
+        for _ in range(self.rng.randint(1, 4)):
+            data = None
+            for attempt in range(self.args.busy_retries):
+                status, data = self.request(endpoint)
+                if status != 202:
+                    break
+                time.sleep(self.args.busy_backoff * (attempt + 1))
+            if not data or data.get("status") != "success":
+                return
+            self.think()
+            if self.rng.random() < self.args.accept_rate:
+                status, _ = self.request("/accept_word", "POST",
+                                         payload={"word": data["word"], "translation": data["translation"]})
+                if status == 200:
+                    self.rec.count("accepted")
+
+    def think(self):
+        if self.args.think_time:
+            time.sleep(self.rng.uniform(0, self.args.think_time))
+
+    def run(self, deadline):
+        self.login()
+        while time.time() < deadline:
+            x = self.rng.random()
+            for name, weight in ACTIONS:
+                x -= weight
+                if x <= 0:
+                    break
+            getattr(self, name)()
+
+def fetch_ollama_stats(url):
+    if not url:
+        return None
+    try:
+        with urllib.request.urlopen(url.rstrip("/") + "/_stats", timeout=5) as resp:
+            return json.loads(resp.read())
+    except Exception:
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end load driver for the vocabulary app.")
+    parser.add_argument("--base-url", default="http://127.0.0.1:5000")
+    parser.add_argument("--ollama-url", default=None, help="fake_ollama.py base URL, for model-call accounting")
+    parser.add_argument("--users", type=int, default=10, help="Concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=60.0, help="Seconds to run")
+    parser.add_argument("--think-time", type=float, default=0.5, help="Max random pause between user steps")
+    parser.add_argument("--accept-rate", type=float, default=0.5, help="Probability of accepting a suggestion")
+    parser.add_argument("--busy-retries", type=int, default=10, help="Retries of a suggestion on 202 busy")
+    parser.add_argument("--busy-backoff", type=float, default=0.5, help="Base backoff between busy retries")
+    parser.add_argument("--wait", type=float, default=0.0, help="Long-poll seconds passed as ?wait= to suggestions")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--run-id", default=None, help="Username prefix; defaults to the start timestamp")
+    args = parser.parse_args()
+    args.run_id = args.run_id or str(int(time.time()))
+
+    recorder = Recorder()
+    before = fetch_ollama_stats(args.ollama_url)
+    start = time.time()
+    deadline = start + args.duration
+    threads = []
+    for i in range(args.users):
+        user = VirtualUser(i, args, recorder, random.Random(args.seed * 7919 + i))
+        t = threading.Thread(target=user.run, args=(deadline,), daemon=True)
+        t.start()
+        threads.append(t)
+    for t in threads:
+        t.join()
+    elapsed = time.time() - start
+    after = fetch_ollama_stats(args.ollama_url)
+
+    total = sum(len(v) for v in recorder.latencies.values())
+    print(f"\n{args.users} users, {elapsed:.1f}s, {total} requests, {total / elapsed:.1f} req/s, "
+          f"{recorder.errors} transport errors")
+    print(f"\n{'endpoint':28} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}  statuses")
+    for endpoint in sorted(recorder.latencies):
+        values = sorted(recorder.latencies[endpoint])
+        statuses = ", ".join(f"{s}:{n}" for (e, s), n in sorted(recorder.statuses.items(), key=str) if e == endpoint)
+        print(f"{endpoint:28} {len(values):>7} {percentile(values, 50) * 1000:>9.1f} "
+              f"{percentile(values, 95) * 1000:>9.1f} {percentile(values, 99) * 1000:>9.1f}  {statuses}")
+
+    suggest_total = sum(n for (e, _), n in recorder.statuses.items() if e in ("/recommend_word", "/recommend_smart_word"))
+    busy = sum(n for (e, s), n in recorder.statuses.items()
+               if e in ("/recommend_word", "/recommend_smart_word") and s == 202)
+    print(f"\nsuggestion requests: {suggest_total}, busy-202 rate: {busy / suggest_total if suggest_total else 0:.1%}")
+    print(f"accepted words: {recorder.accepted}")
+    if before is not None and after is not None:
+        calls = after["calls"] - before["calls"]
+        per_word = calls / recorder.accepted if recorder.accepted else float("inf")
+        print(f"ollama calls: {calls} ({after['failures'] - before['failures']} failed), "
+              f"{per_word:.2f} calls per accepted word")
+
+if __name__ == "__main__":
+    main()
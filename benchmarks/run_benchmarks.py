@@ -0,0 +1,242 @@
+"""
+run_benchmarks.py — micro-benchmarks for the hot helpers in app.py on synthetic databases.
+
+Usage:
+  - python benchmarks/run_benchmarks.py                          # run on 1k, 100k and 1M word databases
+  - python benchmarks/run_benchmarks.py --sizes 1k,100k          # only some sizes
+  - python benchmarks/run_benchmarks.py --save benchmarks/baseline.json
+  - python benchmarks/run_benchmarks.py --compare benchmarks/baseline.json --threshold 0.25 --repeat 5
+
+Each benchmark is measured in --repeat separate rounds; the reported time is the median of the round
+medians and "spread" is how far the round medians were apart, relative to that median. Calls faster than
+MIN_SAMPLE_SECONDS are looped so a single timing sample never sits at timer resolution.
+
+--compare exits with status 1 if any benchmark's median got slower than baseline by more than the
+threshold, or by more than NOISE_FACTOR times the larger of the two spreads if that is wider.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import string
+import argparse
+import platform
+import sqlite3
+import statistics
+import tempfile
+import shutil
+
+# Keep the benchmarked code paths free of log output, metrics and profiling overhead.
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ["METRICS_ENABLED"] = "0"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app as appmod  # noqa: E402
+
+SIZES = {"1k": 1_000, "100k": 100_000, "1m": 1_000_000}
+BUFFER_ITEMS = 2_000  # items in the large suggestion buffer benchmarks
+BENCH_USER = 1
+MIN_SAMPLE_SECONDS = 0.005  # shortest single timing sample; faster calls are repeated inside one sample
+NOISE_FACTOR = 2.0  # a slowdown must exceed this many spreads (as well as --threshold) to count
+
+REALISTIC_AI_OUTPUT = """Here are 4 random words:
+
+1. Lantern: lámpás
+2. Harbor: kikötő
+3. Whisper: suttogás
+4. Meadow: rét
+"""
+MALFORMED_AI_OUTPUT = (
+    "Sure! I picked some nice words for you.\n"
+    "**Lantern** - lámpás\n"
+    "Harbor = kikötő\n"
+    + "Note: " + "x" * 2000 + "\n"
+    "Whisper: suttogás\n"
+)
+
+def _rand_word(rng, n=8):
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(n))
+
+def build_database(path, n_words, seed=1234):
+    """Create a database with the app schema where the bench user owns n_words words."""
+    appmod.DATABASE = path
+    appmod.HMAC_FILE = path + ".hmac"
+    appmod.init_db()
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.execute("INSERT INTO users (id, username, password) VALUES (?, 'bench', 'x')", (BENCH_USER,))
+    conn.execute("INSERT INTO suggestions (userID) VALUES (?)", (BENCH_USER,))
+    batch = []
+    for i in range(n_words):
+        batch.append((BENCH_USER, f"{_rand_word(rng)}{i}", _rand_word(rng), rng.randint(0, 9),
+                      rng.randint(0, 9), rng.randint(0, 9), rng.randint(0, 9)))
+        if len(batch) >= 50_000:
+            conn.executemany("INSERT INTO words (userID, word, translation, pass, passWithHelp, fail, failWithHelp) "
+                             "VALUES (?, ?, ?, ?, ?, ?, ?)", batch)
+            batch = []
+    if batch:
+        conn.executemany("INSERT INTO words (userID, word, translation, pass, passWithHelp, fail, failWithHelp) "
+                         "VALUES (?, ?, ?, ?, ?, ?, ?)", batch)
+    conn.commit()
+    conn.close()
+    appmod.update_db_hmac()
+
+def _loops_for(fn):
+    """How many calls of fn make one sample of at least MIN_SAMPLE_SECONDS."""
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        if time.perf_counter() - start >= MIN_SAMPLE_SECONDS or loops >= 1_000_000:
+            return loops
+        loops *= 10
+
+def measure(fn, setup=None, min_time=0.5, min_runs=3, max_runs=200):
+    """
+    Run fn repeatedly (setup before each run, untimed) and return the per-call times in seconds.
+    Without a setup, fast calls are batched so each sample lasts at least MIN_SAMPLE_SECONDS.
+    """
+    loops = 1 if setup else _loops_for(fn)
+    times = []
+    total = 0.0
+    while len(times) < min_runs or (total < min_time and len(times) < max_runs):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - start
+        times.append(elapsed / loops)
+        total += elapsed
+    return times
+
+def summarize(rounds):
+    """Collapse the per-round sample lists of one benchmark into median/min/spread stats."""
+    medians = [statistics.median(times) for times in rounds]
+    median = statistics.median(medians)
+    return {
+        "median": median,
+        "min": min(min(times) for times in rounds),
+        "spread": (max(medians) - min(medians)) / median if median else 0.0,
+        "runs": sum(len(times) for times in rounds),
+    }
+
+def run_rounds(bench, repeat):
+    """Call bench() repeat times and merge its {name: samples} results into summary stats."""
+    rounds = {}
+    for _ in range(repeat):
+        for name, times in bench().items():
+            rounds.setdefault(name, []).append(times)
+    return {name: summarize(r) for name, r in rounds.items()}
+
+def bench_parse():
+    results = {}
+    results["parse_ai_pairs[realistic]"] = measure(lambda: appmod.parse_ai_pairs(REALISTIC_AI_OUTPUT), min_time=0.2)
+    results["parse_ai_pairs[malformed]"] = measure(lambda: appmod.parse_ai_pairs(MALFORMED_AI_OUTPUT), min_time=0.2)
+    return results
+
+def bench_size(label):
+    results = {}
+
+    results[f"compute_db_hmac[{label}]"] = measure(appmod.compute_db_hmac)
+    results[f"_get_user_words_set_lower[{label}]"] = measure(lambda: appmod._get_user_words_set_lower(BENCH_USER))
+
+    rng = random.Random(99)
+    buffer_items = [{"word": f"zz{_rand_word(rng)}", "translation": _rand_word(rng)} for _ in range(BUFFER_ITEMS)]
+    results[f"write_buffer[{label}]"] = measure(lambda: appmod.write_buffer(BENCH_USER, 'random', buffer_items))
+    results[f"read_buffer[{label}]"] = measure(lambda: appmod.read_buffer(BENCH_USER, 'random'))
+    results[f"pop_from_buffer[{label}]"] = measure(
+        lambda: appmod.pop_from_buffer(BENCH_USER, 'random'),
+        setup=lambda: appmod.write_buffer(BENCH_USER, 'random', buffer_items))
+
+    client = appmod.app.test_client()
+    with client.session_transaction() as sess:
+        sess['userID'] = BENCH_USER
+    results[f"get_random_word[{label}]"] = measure(lambda: client.get('/get_random_word'))
+    results[f"get_word_statistics[{label}]"] = measure(lambda: client.get('/get_word_statistics').get_data())
+    return results
+
+def compare(current, baseline, threshold):
+    """Print a comparison table of medians and return the names of benchmarks that regressed."""
+    regressions = []
+    print(f"\n{'benchmark':45} {'baseline':>12} {'current':>12} {'change':>8} {'allowed':>8}")
+    for name, res in sorted(current.items()):
+        base = baseline.get(name)
+        if not base:
+            print(f"{name:45} {'-':>12} {res['median'] * 1000:>10.3f}ms {'new':>8}")
+            continue
+        change = res['median'] / base['median'] - 1 if base['median'] else 0.0
+        allowed = max(threshold, NOISE_FACTOR * max(base.get('spread', 0.0), res['spread']))
+        flag = ""
+        if change > allowed:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:45} {base['median'] * 1000:>10.3f}ms {res['median'] * 1000:>10.3f}ms "
+              f"{change:>+7.1%} {allowed:>7.0%}{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for app.py hot paths.")
+    parser.add_argument("--sizes", default="1k,100k,1m", help="Comma separated database sizes (1k, 100k, 1m)")
+    parser.add_argument("--save", help="Write results to this JSON baseline file")
+    parser.add_argument("--compare", help="Compare against this JSON baseline file")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Allowed relative slowdown of the median before flagging (widened by spread)")
+    parser.add_argument("--repeat", type=int, default=3, help="Rounds per benchmark; medians are taken across rounds")
+    parser.add_argument("--keep", action="store_true", help="Keep the synthetic databases (printed path)")
+    args = parser.parse_args()
+
+    labels = [s.strip().lower() for s in args.sizes.split(",") if s.strip()]
+    for label in labels:
+        if label not in SIZES:
+            raise SystemExit(f"Unknown size {label!r}; choose from {', '.join(SIZES)}")
+
+    if args.repeat < 1:
+        raise SystemExit("--repeat must be at least 1")
+
+    workdir = tempfile.mkdtemp(prefix="vizsga-bench-")
+    results = run_rounds(bench_parse, args.repeat)
+    try:
+        for label in labels:
+            path = os.path.join(workdir, f"bench_{label}.db")
+            print(f"Building {label} database ({SIZES[label]} words) ...", flush=True)
+            build_database(path, SIZES[label])
+            results.update(run_rounds(lambda: bench_size(label), args.repeat))
+    finally:
+        if args.keep:
+            print(f"Synthetic databases kept in {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    for name, res in sorted(results.items()):
+        print(f"{name:45} median {res['median'] * 1000:10.3f} ms   min {res['min'] * 1000:10.3f} ms   "
+              f"spread {res['spread']:6.1%}   runs {res['runs']}")
+
+    if args.save:
+        payload = {
+            "meta": {
+                "python": platform.python_version(),
+                "sqlite": sqlite3.sqlite_version,
+                "platform": platform.platform(),
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            },
+            "results": results,
+        }
+        with open(args.save, "w") as f:
+            json.dump(payload, f, indent=2, sort_keys=True)
+        print(f"Baseline written to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f).get("results", {})
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
+        print("\nNo regressions above threshold.")
+
+if __name__ == "__main__":
+    main()
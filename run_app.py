@@ -9,6 +9,12 @@ Usage:
   - python run_app.py --install-only   # create venv and install deps, then exit
   - python run_app.py --venv-dir <dir> # use custom venv directory
   - python run_app.py --precache       # pass --precache to app.py (start precache there)
+  - python run_app.py --asgi           # also install uvicorn and serve with app.py --asgi
+  - python run_app.py --reinstall      # reinstall deps even if the venv stamp says they are current
+
+Dependencies are only installed when the venv is new or lacks a package this mode needs: the installed
+package list and Python version are kept in <venv>/.deps-stamp, so restarts (with or without --asgi)
+work without network access.
 """
 
 import os
@@ -17,13 +23,17 @@ import subprocess
 import argparse
 import venv
 import shutil
+import json
+import time
 
 DEFAULT_VENV_DIR = ".venv"
+STAMP_FILE = ".deps-stamp"
 REQUIRED_PACKAGES = [
     "ollama",
     "flask",
     "werkzeug",
 ]
+ASGI_PACKAGES = ["uvicorn"]
 
 def run(cmd, env=None):
     print("> " + " ".join(cmd))
@@ -32,12 +42,36 @@ def run(cmd, env=None):
         raise SystemExit(f"Command failed with exit code {proc.returncode}")
 
 def ensure_venv(venv_dir):
+    """Create the venv if needed; returns True when it was just created."""
     if os.path.exists(venv_dir) and os.path.isdir(venv_dir):
         print(f"Using existing virtual environment: {venv_dir}")
-        return
+        return False
     print(f"Creating virtual environment at {venv_dir} ...")
     venv.create(venv_dir, with_pip=True)
     print("Virtual environment created.")
+    return True
+
+def stamped_packages(venv_dir):
+    """Packages the stamp says are installed for the current interpreter version (empty if unknown)."""
+    try:
+        with open(os.path.join(venv_dir, STAMP_FILE)) as f:
+            stamp = json.load(f)
+    except (OSError, ValueError):
+        return set()
+    if not isinstance(stamp, dict) or stamp.get("python") != list(sys.version_info[:2]):
+        return set()
+    return set(stamp.get("packages", []))
+
+def deps_up_to_date(venv_dir, packages):
+    """True if every package in packages is already installed, e.g. plain mode after an --asgi install."""
+    return set(packages) <= stamped_packages(venv_dir)
+
+def write_stamp(venv_dir, packages):
+    """Record packages as installed, keeping earlier entries (pip install never removes them)."""
+    installed = sorted(stamped_packages(venv_dir) | set(packages))
+    with open(os.path.join(venv_dir, STAMP_FILE), "w") as f:
+        json.dump({"packages": installed, "python": list(sys.version_info[:2])}, f)
+        f.write("\n")
 
 def python_in_venv(venv_dir):
     if os.name == "nt":
@@ -45,9 +79,10 @@ def python_in_venv(venv_dir):
     else:
         return os.path.join(venv_dir, "bin", "python")
 
-def pip_install(venv_python, packages):
-    # Upgrade pip first
-    run([venv_python, "-m", "pip", "install", "--upgrade", "pip", "setuptools", "wheel"])
+def pip_install(venv_python, packages, upgrade_pip=True):
+    # Upgrade pip first (only worth it for a fresh venv)
+    if upgrade_pip:
+        run([venv_python, "-m", "pip", "install", "--upgrade", "pip", "setuptools", "wheel"])
     # Install packages
     cmd = [venv_python, "-m", "pip", "install"] + packages
     run(cmd)
@@ -58,7 +93,12 @@ def main():
     parser.add_argument("--install-only", action="store_true", help="Only create venv and install deps, do not run the app")
     parser.add_argument("--recreate", action="store_true", help="Remove existing venv and recreate it")
     parser.add_argument("--precache", action="store_true", help="Pass --precache to app.py so the app will precache suggestions on startup")
+    parser.add_argument("--asgi", action="store_true", help="Install uvicorn and pass --asgi to app.py (async suggestion endpoints)")
+    parser.add_argument("--reinstall", action="store_true", help="Install dependencies even if the venv stamp is current")
     args = parser.parse_args()
+    launched = time.time()
+    timings = []
+    mark = time.perf_counter()
 
     venv_dir = args.venv_dir
 
@@ -66,19 +106,28 @@ def main():
         print(f"Removing existing venv at {venv_dir} ...")
         shutil.rmtree(venv_dir)
 
-    ensure_venv(venv_dir)
+    created = ensure_venv(venv_dir)
     venv_python = python_in_venv(venv_dir)
+    timings.append(("venv", time.perf_counter() - mark))
+    mark = time.perf_counter()
 
     # Check that python in venv exists
     if not os.path.exists(venv_python):
         raise SystemExit(f"Virtualenv python not found at {venv_python}")
 
-    try:
-        pip_install(venv_python, REQUIRED_PACKAGES)
-    except SystemExit as e:
-        print("Package installation failed:", e)
-        print("You may need to run the script with network access or fix the environment.")
-        sys.exit(1)
+    packages = REQUIRED_PACKAGES + (ASGI_PACKAGES if args.asgi else [])
+    if created or args.reinstall or not deps_up_to_date(venv_dir, packages):
+        try:
+            pip_install(venv_python, packages, upgrade_pip=created or args.reinstall)
+        except SystemExit as e:
+            print("Package installation failed:", e)
+            print("You may need to run the script with network access or fix the environment.")
+            sys.exit(1)
+        write_stamp(venv_dir, packages)
+        timings.append(("install", time.perf_counter() - mark))
+    else:
+        print("Dependencies up to date (stamp matches), skipping install.")
+        timings.append(("install skipped", time.perf_counter() - mark))
 
     if args.install_only:
         print("Installation complete. Exiting (install-only).")
@@ -92,9 +141,14 @@ def main():
     cmd = [venv_python, app_path]
     if args.precache:
         cmd.append("--precache")
+    if args.asgi:
+        cmd.append("--asgi")
 
+    print("Launcher: " + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in timings))
     print("Starting app.py with venv python ...")
-    os.execv(venv_python, cmd)
+    # app.py logs its own startup phases and the total since this launcher started.
+    env = dict(os.environ, APP_LAUNCH_TIME=repr(launched))
+    os.execve(venv_python, cmd, env)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
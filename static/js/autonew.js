@@ -1,12 +1,14 @@
 // autonew.js: AI-backed suggestion UI.
-// No fallback words are ever shown. If AI is unavailable or still generating,
-// the user is informed and placeholders remain.
+// When the AI is unavailable (or SUGGESTION_SOURCE says so) the server answers with a
+// word from its offline dictionary instead; if neither can deliver, or the AI is
+// still generating, the user is informed and placeholders remain.
 
 let currentWord = "";
 let currentTranslation = "";
 let isFetching = false;
 let waitTimer = null;
 const WAIT_THRESHOLD_MS = 800; // when to show "AI is generating" indicator
+const LONG_POLL_SECONDS = 25; // server holds the request this long while AI generates
 
 function getUrlParam(name) {
   return new URLSearchParams(window.location.search).get(name);
@@ -71,7 +73,7 @@ function fetchSuggestion() {
     setAiStatus(true, "AI dolgozik — kérlek várj...");
   }, WAIT_THRESHOLD_MS);
 
-  fetch(endpoint, { credentials: "same-origin" })
+  fetch(endpoint + "?wait=" + LONG_POLL_SECONDS, { credentials: "same-origin" })
     .then(async (r) => {
       clearTimeout(waitTimer);
       waitTimer = null;
@@ -84,6 +86,13 @@ function fetchSuggestion() {
         data = {};
       }
 
+      if (r.status === 202) {
+        // Long-poll timed out while the AI is still generating: wait again.
+        setAiStatus(true, (data && data.message) || "AI dolgozik — kérlek várj...");
+        fetchSuggestion();
+        return;
+      }
+
       if (!r.ok || data.status !== "success") {
         handleServerFailure(r.status, data);
         return;
@@ -1,9 +1,16 @@
 // edit.js: functionality for editing and deleting user words in a table.
 // The file loads words, provides inline edit UI and makes AJAX calls to update the server.
 
+// Current search state: only the visible page is fetched from /search_words.
+let currentQuery = "";
+let currentPage = 1;
+let totalPages = 1;
+let searchTimer = null;
+
 function loadWords() {
-  // Request user's words and populate the table body (#wordsList)
-  fetch("/get_user_words")
+  // Request the current page of matching words and populate the table body (#wordsList)
+  const params = new URLSearchParams({ q: currentQuery, page: currentPage });
+  fetch("/search_words?" + params.toString())
     .then((response) => response.json())
     .then((data) => {
       if (data.status === "success") {
@@ -29,6 +36,14 @@ function loadWords() {
                             `;
           wordsList.appendChild(row);
         });
+
+        totalPages = Math.max(1, Math.ceil(data.total / data.per_page));
+        const pageInfo = document.getElementById("pageInfo");
+        if (pageInfo) pageInfo.textContent = `${currentPage} / ${totalPages}`;
+        const prev = document.getElementById("prevPage");
+        const next = document.getElementById("nextPage");
+        if (prev) prev.disabled = currentPage <= 1;
+        if (next) next.disabled = currentPage >= totalPages;
       }
     });
 }
@@ -128,6 +143,37 @@ document.addEventListener("DOMContentLoaded", function () {
       }
     });
 
+    // Debounced search: restart from the first page whenever the query changes
+    const search = document.getElementById("wordSearch");
+    if (search) {
+      search.addEventListener("input", function () {
+        clearTimeout(searchTimer);
+        searchTimer = setTimeout(() => {
+          currentQuery = search.value.trim();
+          currentPage = 1;
+          loadWords();
+        }, 250);
+      });
+    }
+    const prev = document.getElementById("prevPage");
+    if (prev) {
+      prev.addEventListener("click", function () {
+        if (currentPage > 1) {
+          currentPage--;
+          loadWords();
+        }
+      });
+    }
+    const next = document.getElementById("nextPage");
+    if (next) {
+      next.addEventListener("click", function () {
+        if (currentPage < totalPages) {
+          currentPage++;
+          loadWords();
+        }
+      });
+    }
+
     loadWords();
   }
 });
@@ -0,0 +1,3 @@
+// logout.js: runs on the page shown after logout and forgets this browser's offline practice data.
+
+clearPracticeData();
@@ -0,0 +1,128 @@
+// practiceSync.js: offline outbox for practice results and batched upload to /sync_scores.
+// Loaded by the practice page, the logout page and the service worker (sw.js), so it must not touch the DOM.
+
+const PRACTICE_DB = "practice";
+const OUTBOX = "outbox";
+const SYNC_BATCH = 200; // results per /sync_scores request (server allows up to SYNC_MAX_EVENTS)
+const SHELL_CACHE = "shell-v1"; // service worker caches, named here so the logout page can clear them too
+const DATA_CACHE = "data-v1";
+
+let practiceDbPromise = null;
+let memoryOutbox = []; // used when IndexedDB is unavailable (e.g. some private browsing modes)
+let syncInFlight = null;
+
+function openPracticeDb() {
+  if (!practiceDbPromise) {
+    practiceDbPromise = new Promise((resolve) => {
+      if (typeof indexedDB === "undefined") return resolve(null);
+      const req = indexedDB.open(PRACTICE_DB, 1);
+      req.onupgradeneeded = () => {
+        req.result.createObjectStore(OUTBOX, { keyPath: "id" });
+      };
+      req.onsuccess = () => resolve(req.result);
+      req.onerror = () => resolve(null);
+    });
+  }
+  return practiceDbPromise;
+}
+
+function newClientId() {
+  // The server deduplicates on this id, so a retried batch is never counted twice.
+  if (self.crypto && self.crypto.randomUUID) return self.crypto.randomUUID();
+  return Date.now().toString(36) + "-" + Math.random().toString(36).slice(2);
+}
+
+function outboxRequest(mode, fn) {
+  return openPracticeDb().then(
+    (db) =>
+      new Promise((resolve, reject) => {
+        if (!db) return resolve(fn(null));
+        const tx = db.transaction(OUTBOX, mode);
+        const result = fn(tx.objectStore(OUTBOX));
+        // fn returns an IDBRequest (or null); its result is only final once the transaction completes.
+        tx.oncomplete = () => resolve(result ? result.result : null);
+        tx.onerror = () => reject(tx.error);
+      })
+  );
+}
+
+function queueResult(userId, wordId, status) {
+  // Store one practice result locally; it is uploaded later by syncResults().
+  // The server only applies it while userId is the logged in user.
+  const entry = {
+    id: newClientId(),
+    user_id: userId,
+    word_id: wordId,
+    status: status,
+    ts: Date.now() / 1000,
+  };
+  return outboxRequest("readwrite", (store) => {
+    if (!store) {
+      memoryOutbox.push(entry);
+      return null;
+    }
+    return store.put(entry);
+  });
+}
+
+function pendingResults(limit) {
+  return outboxRequest("readonly", (store) =>
+    store ? store.getAll(null, limit) : memoryOutbox.slice(0, limit)
+  );
+}
+
+function removeResults(ids) {
+  return outboxRequest("readwrite", (store) => {
+    if (!store) {
+      memoryOutbox = memoryOutbox.filter((e) => !ids.includes(e.id));
+      return null;
+    }
+    ids.forEach((id) => store.delete(id));
+    return null;
+  });
+}
+
+function syncBatch() {
+  return pendingResults(SYNC_BATCH).then((batch) => {
+    if (!batch.length) return 0;
+    return fetch("/sync_scores", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      credentials: "same-origin",
+      keepalive: true,
+      body: JSON.stringify({ events: batch }),
+    }).then((res) => {
+      if (!res.ok) throw new Error("sync failed: " + res.status);
+      return removeResults(batch.map((e) => e.id)).then(() =>
+        batch.length === SYNC_BATCH ? syncBatch().then((n) => n + batch.length) : batch.length
+      );
+    });
+  });
+}
+
+function clearPracticeData() {
+  // On logout: drop queued results and the cached deck and practice page, so the next user of this browser
+  // neither uploads nor practises the previous user's words.
+  memoryOutbox = [];
+  const cleared = [outboxRequest("readwrite", (store) => (store ? store.clear() : null)).catch(() => {})];
+  if (typeof caches !== "undefined") {
+    cleared.push(caches.delete(DATA_CACHE).catch(() => {}));
+    cleared.push(
+      caches
+        .open(SHELL_CACHE)
+        .then((cache) => cache.delete("/practice"))
+        .catch(() => {})
+    );
+  }
+  return Promise.all(cleared);
+}
+
+function syncResults() {
+  // Upload every queued result in batches; concurrent callers share the same run.
+  if (!syncInFlight) {
+    syncInFlight = syncBatch().finally(() => {
+      syncInFlight = null;
+    });
+  }
+  return syncInFlight;
+}
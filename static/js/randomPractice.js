@@ -3,9 +3,14 @@
 let currentWord;
 let currentTranslation;
 let wordID;
+const userID = Number(document.querySelector("main").dataset.userId); // tags queued results, see queueResult()
 let translationDirection = true; // true means display English and expect Hungarian
 let helpUsed = false;
 
+let deck = []; // the user's words, loaded once; cached by the service worker for offline practice
+let unsyncedResults = 0;
+const SYNC_EVERY = 20; // upload after this many results (also on a timer, when back online and when leaving)
+
 let learningMode = false;
 let learningWordIDs = [];
 let usedLearningWordIDs = [];
@@ -104,6 +109,37 @@ function pickNextLearningWord() {
     });
 }
 
+function loadDeck() {
+  // Fetch the whole deck once; words are then picked locally without a round trip each.
+  if (deck.length) return Promise.resolve(deck);
+  return fetch("/get_user_words")
+    .then((response) => response.json())
+    .then((data) => {
+      deck = data.status === "success" ? data.words : [];
+      return deck;
+    });
+}
+
+function recordResult(status) {
+  // Queue the result locally and upload in batches, so answering never waits for the network.
+  return queueResult(userID, wordID, status).then(() => {
+    unsyncedResults += 1;
+    if (unsyncedResults >= SYNC_EVERY) flushResults();
+  });
+}
+
+function flushResults() {
+  unsyncedResults = 0;
+  return syncResults().catch(() => {
+    // Offline: let the service worker retry once the connection is back, if the browser supports it.
+    if ("serviceWorker" in navigator) {
+      navigator.serviceWorker.ready
+        .then((reg) => reg.sync && reg.sync.register("practice-sync"))
+        .catch(() => {});
+    }
+  });
+}
+
 function loadRandomWord() {
   // Central entry point for loading the next word into the UI.
   setInputState(false);
@@ -111,18 +147,18 @@ function loadRandomWord() {
   if (learningMode) {
     pickNextLearningWord();
   } else {
-    fetch("/get_random_word")
-      .then((response) => response.json())
-      .then((data) => {
-        if (data.status === "error") {
-          wordDisplay.innerText = data.message || "Nincs több szó!";
+    loadDeck()
+      .then((words) => {
+        if (!words.length) {
+          wordDisplay.innerText = "Nincs több szó!";
           inputField.placeholder = "";
           setInputState(false);
           return;
         }
+        const data = words[Math.floor(Math.random() * words.length)];
         currentWord = data.word;
         currentTranslation = data.translation;
-        wordID = data.word_id;
+        wordID = data.id;
         inputField.value = "";
         clearFeedback();
         setInputState(true);
@@ -145,6 +181,18 @@ function loadRandomWord() {
 
 window.onload = loadRandomWord;
 
+if ("serviceWorker" in navigator) {
+  navigator.serviceWorker.register("/sw.js").catch((error) => {
+    console.warn("Service worker registration failed:", error);
+  });
+}
+setInterval(flushResults, 30000);
+window.addEventListener("online", flushResults);
+document.addEventListener("visibilitychange", () => {
+  if (document.visibilityState === "hidden") flushResults();
+});
+flushResults(); // results left over from an earlier (offline) session
+
 document.querySelector("#Switch").addEventListener("click", function () {
   // Toggle translation direction on both server (session) and client for immediate UX changes.
   fetch("/switch_translation", { method: "POST" })
@@ -178,19 +226,9 @@ document.querySelector("#Check").addEventListener("click", function () {
     status = helpUsed ? "failWithHelp" : "fail";
   }
 
-  // Persist result to server, then show feedback and load next word after a small delay.
-  fetch("/update_score", {
-    method: "POST",
-    headers: {
-      "Content-Type": "application/json",
-    },
-    body: JSON.stringify({
-      word_id: wordID,
-      status: status,
-    }),
-  })
-    .then((response) => response.json())
-    .then((data) => {
+  // Queue the result locally, then show feedback and load next word after a small delay.
+  recordResult(status)
+    .then(() => {
       showFeedback(
         isCorrect ? "Helyes!" : `Helytelen! A jó válasz: "${correctAnswer}"`,
         isCorrect
@@ -216,18 +254,8 @@ document.querySelector("#GiveUp").addEventListener("click", function () {
 
   const status = helpUsed ? "failWithHelp" : "fail";
 
-  fetch("/update_score", {
-    method: "POST",
-    headers: {
-      "Content-Type": "application/json",
-    },
-    body: JSON.stringify({
-      word_id: wordID,
-      status: status,
-    }),
-  })
-    .then((response) => response.json())
-    .then((data) => {
+  recordResult(status)
+    .then(() => {
       showFeedback(`Feladva! A jó válasz: "${correctAnswer}"`, false);
       setTimeout(() => {
         clearFeedback();
@@ -79,6 +79,46 @@ function applyTheme() {
   showMessage("Téma megváltoztatva: " + theme);
 }
 
+function importWords() {
+  // Upload the selected file as the raw request body and show the streamed progress records.
+  const input = document.getElementById("importFile");
+  const file = input && input.files[0];
+  if (!file) {
+    showMessage("Válassz ki egy fájlt", "error");
+    return;
+  }
+  const format = /\.(jsonl|ndjson)$/i.test(file.name) ? "jsonl" : "csv";
+
+  fetch("/import_words?format=" + format, { method: "POST", body: file })
+    .then(async (r) => {
+      const reader = r.body.getReader();
+      const decoder = new TextDecoder();
+      let pending = "";
+      let last = null;
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        pending += decoder.decode(value, { stream: true });
+        const lines = pending.split("\n");
+        pending = lines.pop();
+        lines.filter((l) => l.trim()).forEach((l) => {
+          last = JSON.parse(l);
+          if (last.status === "progress") {
+            showMessage("Importálás... " + last.inserted + " szó hozzáadva");
+          }
+        });
+      }
+      if (last && last.status === "success") {
+        showMessage(
+          "Importálva: " + last.inserted + " szó, kihagyva: " + last.skipped
+        );
+      } else {
+        showMessage((last && last.message) || "Sikertelen importálás", "error");
+      }
+    })
+    .catch(() => showMessage("Hálózati hiba", "error"));
+}
+
 document.addEventListener("DOMContentLoaded", () => {
   loadUserInfo();
   const saveBtn = document.getElementById("saveBtn");
@@ -87,4 +127,6 @@ document.addEventListener("DOMContentLoaded", () => {
   if (logoutBtn) logoutBtn.addEventListener("click", logout);
   const applyBtn = document.getElementById("applyThemeBtn");
   if (applyBtn) applyBtn.addEventListener("click", applyTheme);
+  const importBtn = document.getElementById("importBtn");
+  if (importBtn) importBtn.addEventListener("click", importWords);
 });
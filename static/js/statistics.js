@@ -91,6 +91,31 @@ function loadStatistics() {
     });
 }
 
+function loadTimeline() {
+  // Fetch weekly attempts/accuracy (newest first) from the practice rollups
+  fetch("/get_practice_timeseries?period=week&count=8")
+    .then((response) => response.json())
+    .then((data) => {
+      const tbody = document.getElementById("timelineBody");
+      if (!tbody || data.status !== "success") return;
+      tbody.innerHTML = "";
+      data.series
+        .slice()
+        .reverse()
+        .forEach((week) => {
+          const row = document.createElement("tr");
+          const accuracy =
+            week.accuracy === null ? "-" : `${Math.round(week.accuracy * 100)}%`;
+          row.innerHTML = `
+                    <td>${week.start}</td>
+                    <td>${week.attempts}</td>
+                    <td>${accuracy}</td>
+                `;
+          tbody.appendChild(row);
+        });
+    });
+}
+
 document.addEventListener("DOMContentLoaded", function () {
   // Hook up column sort buttons identified by .sort-button and data-sort attribute
   document.querySelectorAll(".sort-button").forEach((button) => {
@@ -100,4 +125,5 @@ document.addEventListener("DOMContentLoaded", function () {
     });
   });
   loadStatistics();
+  loadTimeline();
 });
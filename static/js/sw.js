@@ -0,0 +1,78 @@
+// sw.js: service worker keeping practice usable offline.
+// Caches the practice page, the fingerprinted bundles and the word deck; uploads queued results on background sync.
+
+importScripts("/static/js/practiceSync.js"); // also defines SHELL_CACHE and DATA_CACHE
+
+self.addEventListener("install", (event) => {
+  event.waitUntil(
+    Promise.all([
+      caches.open(SHELL_CACHE).then((cache) => cache.add("/practice")),
+      caches.open(DATA_CACHE).then((cache) => cache.add("/get_user_words")),
+    ])
+      .catch(() => {}) // not logged in yet: caches fill on the first online visit
+      .then(() => self.skipWaiting())
+  );
+});
+
+self.addEventListener("activate", (event) => {
+  event.waitUntil(
+    caches
+      .keys()
+      .then((keys) =>
+        Promise.all(
+          keys
+            .filter((k) => k !== SHELL_CACHE && k !== DATA_CACHE)
+            .map((k) => caches.delete(k))
+        )
+      )
+      .then(() => self.clients.claim())
+  );
+});
+
+function networkFirst(request, cacheName) {
+  // Fresh copy when online (new bundle hashes, edited words), cached copy when not.
+  return fetch(request)
+    .then((response) => {
+      if (response.ok && !response.redirected) {
+        const copy = response.clone();
+        caches.open(cacheName).then((cache) => cache.put(request, copy));
+      }
+      return response;
+    })
+    .catch(() =>
+      caches.match(request).then((cached) => cached || Response.error())
+    );
+}
+
+function cacheFirst(request) {
+  // /assets/ names change with their content, so a cached copy is never stale.
+  return caches.match(request).then(
+    (cached) =>
+      cached ||
+      fetch(request).then((response) => {
+        if (response.ok) {
+          const copy = response.clone();
+          caches.open(SHELL_CACHE).then((cache) => cache.put(request, copy));
+        }
+        return response;
+      })
+  );
+}
+
+self.addEventListener("fetch", (event) => {
+  const url = new URL(event.request.url);
+  if (event.request.method !== "GET" || url.origin !== self.location.origin) return;
+  if (url.pathname.startsWith("/assets/")) {
+    event.respondWith(cacheFirst(event.request));
+  } else if (url.pathname === "/practice") {
+    event.respondWith(networkFirst(event.request, SHELL_CACHE));
+  } else if (url.pathname === "/get_user_words") {
+    event.respondWith(networkFirst(event.request, DATA_CACHE));
+  }
+});
+
+self.addEventListener("sync", (event) => {
+  if (event.tag === "practice-sync") {
+    event.waitUntil(syncResults());
+  }
+});
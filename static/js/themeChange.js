@@ -4,8 +4,12 @@
 function applyThemeClient(themeName, persistToServer = true) {
   var link = document.getElementById("themeStylesheet");
   if (link) {
-    // Change the stylesheet href to the selected theme file. Assumes theme CSS files are available on server.
-    link.href = "/static/styles/themes/" + themeName + ".css";
+    // Change the stylesheet href to the selected theme's fingerprinted build (map rendered by base.html).
+    var urls = {};
+    try {
+      urls = JSON.parse(link.dataset.themeUrls || "{}");
+    } catch (e) {}
+    link.href = urls[themeName] || "/static/styles/themes/" + themeName + ".css";
   }
 
   try {
@@ -0,0 +1,46 @@
+"""Tests for the fingerprinted static bundles built by build_assets()."""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app as appmod  # noqa: E402
+
+TEMPLATE_FIXTURE = """// fixture.js: a template literal spanning lines
+function banner(name) {
+  const text = `Hello ${name}
+
+    indented line
+    // not a comment
+`;
+  return text;
+}
+"""
+
+PLAIN_FIXTURE = """// plain.js
+function add(a, b) {
+
+    return a + b; // sum
+}
+"""
+
+def build(tmp_path, monkeypatch, sources):
+    """Run build_assets() over sources ({file name: text}), one bundle per file; returns {name: built text}."""
+    static = tmp_path / "static"
+    (static / "js").mkdir(parents=True)
+    for fname, text in sources.items():
+        (static / "js" / fname).write_text(text, encoding="utf-8")
+    monkeypatch.setattr(appmod.app, "static_folder", str(static))
+    monkeypatch.setattr(appmod, "ASSET_BUILD_DIR", str(tmp_path / "dist"))
+    monkeypatch.setattr(appmod, "ASSET_BUNDLES", {fname: [f"js/{fname}"] for fname in sources})
+    manifest = appmod.build_assets()
+    return {name: (tmp_path / "dist" / hashed).read_text(encoding="utf-8") for name, hashed in manifest.items()}
+
+def test_template_literal_survives_build(tmp_path, monkeypatch):
+    built = build(tmp_path, monkeypatch, {"fixture.js": TEMPLATE_FIXTURE})
+    literal = TEMPLATE_FIXTURE.split("`")[1]
+    assert f"`{literal}`" in built["fixture.js"]
+
+def test_plain_file_is_still_minified(tmp_path, monkeypatch):
+    built = build(tmp_path, monkeypatch, {"plain.js": PLAIN_FIXTURE})
+    assert built["plain.js"] == "function add(a, b) {\nreturn a + b; // sum\n}"